@@ -0,0 +1,100 @@
+"""
+Rasm/formula aniqlash micro-benchmark'i: paragraf bo'yicha uchta XPath (eski usul)
+va bitta teg aylanishi (count_cell_media) solishtiriladi.
+
+row.cells oldindan bir marta olinadi, shuning uchun faqat aniqlash bosqichi o'lchanadi.
+
+Ishlatish:
+    python -m benchmarks.bench_media_detection                 # vaqtinchalik korpusda
+    python -m benchmarks.bench_media_detection --file test.docx
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from docx import Document
+
+from benchmarks.corpus import build_document_xml, write_docx
+from handlers.docx_stream import count_cell_media
+
+
+def detect_xpath(rows: list) -> tuple:
+    """Eski usul: har bir paragrafda uchta alohida XPath so'rovi"""
+    images = 0
+    equations = 0
+    for cells in rows:
+        for cell in cells:
+            for paragraph in cell.paragraphs:
+                if paragraph._element.xpath('.//w:drawing'):
+                    images += 1
+                if paragraph._element.xpath('.//w:object'):
+                    equations += 1
+                if paragraph._element.xpath('.//m:oMath'):
+                    equations += 1
+    return images, equations
+
+
+def detect_single_walk(rows: list) -> tuple:
+    """Yangi usul: katak bo'yicha bitta aylanish, birlashgan kataklar qatorda bir marta"""
+    images = 0
+    equations = 0
+    for cells in rows:
+        media_by_tc = {}
+        for cell in cells:
+            tc = cell._tc
+            media = media_by_tc.get(id(tc))
+            if media is None:
+                media = media_by_tc[id(tc)] = count_cell_media(tc)
+            images += media[0]
+            equations += media[1]
+    return images, equations
+
+
+def _best_of(func, rows: list, repeat: int) -> tuple:
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(rows)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rasm/formula aniqlash benchmark'i")
+    parser.add_argument("--file", help="Tekshiriladigan DOCX (berilmasa sintetik fayl yaratiladi)")
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    path = args.file
+    tmp_dir = None
+    if not path:
+        tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp_dir.name, "media.docx")
+        write_docx(path, build_document_xml(args.questions, 4, merged=0.1, images=0.1, ole=0.05, equations=0.1, seed=1))
+
+    try:
+        doc = Document(path)
+        rows = [row.cells for table in doc.tables for row in table.rows]
+
+        old_time, old_result = _best_of(detect_xpath, rows, args.repeat)
+        new_time, new_result = _best_of(detect_single_walk, rows, args.repeat)
+    finally:
+        if tmp_dir:
+            tmp_dir.cleanup()
+
+    print(f"Qatorlar: {len(rows)}")
+    print(f"XPath x3:        {old_time * 1000:8.1f} ms  (rasm, formula) = {old_result}")
+    print(f"Bitta aylanish:  {new_time * 1000:8.1f} ms  (rasm, formula) = {new_result}")
+    print(f"Tezlashish:      {old_time / new_time:8.1f}x")
+
+    if old_result != new_result:
+        print("❌ Natijalar mos kelmadi!")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
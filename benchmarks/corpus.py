@@ -0,0 +1,188 @@
+"""
+Benchmark uchun sintetik test DOCX fayllar generatori.
+
+python-docx talab qilinmaydi: fayl to'g'ridan-to'g'ri zip + XML sifatida yoziladi,
+shuning uchun birlashgan kataklar, rasmlar, OLE obyektlar va OMML formulalarni
+aniq nazorat qilish mumkin.
+
+Ishlatish:
+    python -m benchmarks.corpus --out benchmarks/corpus --profile default
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+# 1x1 PNG (inline rasm uchun)
+PNG_1PX = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC"
+)
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Default Extension="png" ContentType="image/png"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>"""
+
+ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+DOCUMENT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rIdImg1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" Target="media/image1.png"/>
+</Relationships>"""
+
+DOCUMENT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:document'
+    ' xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+    ' xmlns:m="http://schemas.openxmlformats.org/officeDocument/2006/math"'
+    ' xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"'
+    ' xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+    ' xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture"'
+    ' xmlns:v="urn:schemas-microsoft-com:vml"'
+    ' xmlns:o="urn:schemas-microsoft-com:office:office">'
+    '<w:body>'
+)
+DOCUMENT_TAIL = '<w:sectPr/></w:body></w:document>'
+
+DRAWING = (
+    '<w:r><w:drawing><wp:inline><wp:extent cx="9525" cy="9525"/><wp:docPr id="{id}" name="Picture {id}"/>'
+    '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+    '<pic:pic><pic:nvPicPr><pic:cNvPr id="{id}" name="image1.png"/><pic:cNvPicPr/></pic:nvPicPr>'
+    '<pic:blipFill><a:blip r:embed="rIdImg1"/></pic:blipFill><pic:spPr/></pic:pic>'
+    '</a:graphicData></a:graphic></wp:inline></w:drawing></w:r>'
+)
+OLE_OBJECT = '<w:r><w:object><v:shape id="ole{id}" style="width:20pt;height:10pt"/></w:object></w:r>'
+OMML = '<m:oMath><m:r><m:t>x{id}^2+1</m:t></m:r></m:oMath>'
+
+# Tayyor korpus profillari: (nom, savollar, javob ustunlari, birlashgan, rasm, OLE, formula ulushi)
+PROFILES = {
+    "default": [
+        ("plain_200x4", 200, 4, 0.0, 0.0, 0.0, 0.0),
+        ("plain_2000x5", 2000, 5, 0.0, 0.0, 0.0, 0.0),
+        ("merged_1000x4", 1000, 4, 0.2, 0.0, 0.0, 0.0),
+        ("media_1000x4", 1000, 4, 0.0, 0.1, 0.05, 0.1),
+        ("mixed_5000x5", 5000, 5, 0.1, 0.05, 0.02, 0.05),
+    ],
+    "large": [
+        ("plain_10000x5", 10000, 5, 0.0, 0.0, 0.0, 0.0),
+        ("mixed_10000x5", 10000, 5, 0.1, 0.05, 0.02, 0.05),
+    ],
+}
+
+
+def _run(text: str) -> str:
+    return f'<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+
+def _cell(content: str, props: str = "") -> str:
+    tc_pr = f"<w:tcPr>{props}</w:tcPr>" if props else ""
+    return f"<w:tc>{tc_pr}<w:p>{content}</w:p></w:tc>"
+
+
+def build_document_xml(questions: int, answers: int, merged: float = 0.0, images: float = 0.0,
+                       ole: float = 0.0, equations: float = 0.0, seed: int = 0) -> str:
+    """Bitta jadvaldan iborat test hujjati uchun word/document.xml matnini qaytaradi"""
+    rnd = random.Random(seed)
+    columns = answers + 1
+    parts = [DOCUMENT_HEAD, '<w:p>' + _run("Sintetik test fayli") + '</w:p>']
+    parts.append('<w:tbl><w:tblPr/><w:tblGrid>' + '<w:gridCol/>' * columns + '</w:tblGrid>')
+
+    vmerge_open = False
+    for q in range(1, questions + 1):
+        row = []
+        # vMerge davomi faqat oldingi qatorning oxirgi ustuni alohida katak bo'lsa mumkin
+        last_column_open = vmerge_open
+        vmerge_open = False
+        question = _run(f"{q}. Savol matni raqam {q} uchun?")
+        if rnd.random() < equations:
+            question += OMML.format(id=q)
+        if rnd.random() < images:
+            question += DRAWING.format(id=q)
+        if rnd.random() < ole:
+            question += OLE_OBJECT.format(id=q)
+        row.append(_cell(question))
+
+        col = 1
+        while col < columns:
+            text = _run(f"Javob {q}.{col}")
+            # Gorizontal birlashtirish (gridSpan) - ikki ustunni bittaga
+            if col + 1 < columns - 1 and rnd.random() < merged / 2:
+                row.append(_cell(text, '<w:gridSpan w:val="2"/>'))
+                col += 2
+                continue
+            # Oxirgi ustunda vertikal birlashtirish (vMerge)
+            if col == columns - 1 and merged:
+                if last_column_open and rnd.random() < 0.5:
+                    row.append(_cell("", '<w:vMerge/>'))
+                    vmerge_open = True
+                    col += 1
+                    continue
+                vmerge_open = rnd.random() < merged / 2
+                if vmerge_open:
+                    row.append(_cell(text, '<w:vMerge w:val="restart"/>'))
+                    col += 1
+                    continue
+            row.append(_cell(text))
+            col += 1
+
+        parts.append('<w:tr>' + ''.join(row) + '</w:tr>')
+
+    parts.append('</w:tbl>')
+    parts.append(DOCUMENT_TAIL)
+    return "".join(parts)
+
+
+def write_docx(path: str, document_xml: str):
+    """Minimal, python-docx ochadigan DOCX paketini yozadi"""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", ROOT_RELS)
+        archive.writestr("word/_rels/document.xml.rels", DOCUMENT_RELS)
+        archive.writestr("word/media/image1.png", PNG_1PX)
+        archive.writestr("word/document.xml", document_xml)
+
+
+def generate_corpus(out_dir: str, profile: str = "default", seed: int = 42) -> list:
+    """Profil bo'yicha korpusni yaratadi va manifest (fayl ro'yxati) qaytaradi"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = []
+
+    for index, (name, questions, answers, merged, images, ole, equations) in enumerate(PROFILES[profile]):
+        path = os.path.join(out_dir, f"{name}.docx")
+        write_docx(path, build_document_xml(questions, answers, merged, images, ole, equations, seed + index))
+        manifest.append({
+            "name": name,
+            "path": path,
+            "questions": questions,
+            "answers": answers,
+            "size": os.path.getsize(path),
+        })
+
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sintetik test DOCX korpusini yaratish")
+    parser.add_argument("--out", default="benchmarks/corpus", help="Korpus papkasi")
+    parser.add_argument("--profile", default="default", choices=sorted(PROFILES))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for item in generate_corpus(args.out, args.profile, args.seed):
+        print(f"✅ {item['path']} ({item['questions']} savol, {item['size'] / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Konvertatsiya micro-benchmark'i.
+
+Har bir rejim (python-docx / oqim) alohida toza processda ishga tushiriladi, shuning
+uchun peak RSS rejimlar orasida aralashib ketmaydi.
+
+Ishlatish:
+    python -m benchmarks.corpus                       # korpusni yaratish
+    python -m benchmarks.run --save-baseline          # natijani baseline sifatida saqlash
+    python -m benchmarks.run --compare                # baseline bilan solishtirish (regressiyada exit 1)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+MODES = ("docx", "stream")
+
+
+def _bench_mode(mode: str, files: list, repeat: int) -> dict:
+    """Bitta rejimni joriy (yangi) processda o'lchaydi"""
+    from handlers.convert import analyze_docx_file, convert_docx_to_bytes, parse_docx_file, parse_docx_streaming
+
+    parse = parse_docx_streaming if mode == "stream" else parse_docx_file
+    stages = {"read": 0.0, "parse": 0.0, "render": 0.0, "analyze": 0.0}
+    total_files = 0
+    total_questions = 0
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for path in files:
+            t0 = time.perf_counter()
+            with open(path, "rb") as f:
+                data = f.read()
+            t1 = time.perf_counter()
+            parsed = parse(data)
+            t2 = time.perf_counter()
+            convert_docx_to_bytes(None, parsed)
+            t3 = time.perf_counter()
+
+            stages["read"] += t1 - t0
+            stages["parse"] += t2 - t1
+            stages["render"] += t3 - t2
+            total_files += 1
+            total_questions += parsed["analysis"]["total_questions"]
+    elapsed = time.perf_counter() - started
+
+    # analyze_docx_file alohida bosqich sifatida (fayl/s hisobiga kirmaydi)
+    if mode == "docx":
+        t0 = time.perf_counter()
+        for path in files:
+            analyze_docx_file(path)
+        stages["analyze"] = time.perf_counter() - t0
+
+    return {
+        "files": total_files,
+        "questions": total_questions,
+        "elapsed": elapsed,
+        "files_per_sec": total_files / elapsed if elapsed else 0.0,
+        "questions_per_sec": total_questions / elapsed if elapsed else 0.0,
+        # Linux'da ru_maxrss kilobaytda
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages": {name: round(value, 4) for name, value in stages.items()},
+    }
+
+
+def run_benchmark(files: list, repeat: int = 1, modes=MODES) -> dict:
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for mode in modes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[mode] = executor.submit(_bench_mode, mode, files, repeat).result()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Baseline'dan tolerance ulushidan ko'proq yomonlashgan ko'rsatkichlar ro'yxati"""
+    regressions = []
+    for mode, current in results.items():
+        base = baseline.get(mode)
+        if not base:
+            continue
+        for metric in ("files_per_sec", "questions_per_sec"):
+            if base[metric] and current[metric] < base[metric] * (1 - tolerance):
+                regressions.append(f"{mode}.{metric}: {current[metric]:.1f} < {base[metric]:.1f}")
+        if base["peak_rss_mb"] and current["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{mode}.peak_rss_mb: {current['peak_rss_mb']:.1f} > {base['peak_rss_mb']:.1f}")
+    return regressions
+
+
+def print_report(results: dict):
+    print(f"{'rejim':<8} {'fayl/s':>9} {'savol/s':>11} {'RSS MB':>8}   bosqichlar (s)")
+    for mode, r in results.items():
+        stages = ", ".join(f"{name}={value:.3f}" for name, value in r["stages"].items() if value)
+        print(f"{mode:<8} {r['files_per_sec']:>9.2f} {r['questions_per_sec']:>11.0f} {r['peak_rss_mb']:>8.1f}   {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DOCX konvertatsiya benchmark'i")
+    parser.add_argument("--corpus", default="benchmarks/corpus", help="corpus.py yaratgan papka")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--mode", choices=MODES, action="append", help="Faqat shu rejim(lar)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Ruxsat etilgan yomonlashuv (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    manifest_path = os.path.join(args.corpus, "manifest.json")
+    if not os.path.exists(manifest_path):
+        print(f"❌ Korpus topilmadi: {args.corpus}. Avval: python -m benchmarks.corpus --out {args.corpus}")
+        sys.exit(2)
+
+    with open(manifest_path, encoding="utf-8") as f:
+        files = [item["path"] for item in json.load(f)]
+
+    results = run_benchmark(files, args.repeat, args.mode or MODES)
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saqlandi: {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"❌ Baseline topilmadi: {args.baseline}")
+            sys.exit(2)
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("⚠️ Regressiya:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("✅ Baseline bilan solishtirildi - regressiya yo'q")
+
+
+if __name__ == "__main__":
+    main()
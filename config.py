@@ -27,3 +27,75 @@ pg_user_enc = quote_plus(pg_user)
 pg_password_enc = quote_plus(pg_password)
 
 DB_DSN = f"postgresql+asyncpg://{pg_user_enc}:{pg_password_enc}@{pg_host}:{pg_port}/{pg_db}"
+
+# Konvertatsiya process pool sozlamalari
+CONVERT_WORKERS = int(os.getenv("CONVERT_WORKERS", "0")) or os.cpu_count() or 1  # 0 = CPU yadrolari soni
+CONVERT_TIMEOUT = float(os.getenv("CONVERT_TIMEOUT", "120"))  # Bitta fayl uchun maksimal vaqt (sekund)
+
+# DOCX ni oqim (iterparse) rejimida o'qish - katta fayllarda xotira tejaladi
+DOCX_STREAMING = os.getenv("DOCX_STREAMING", "0") == "1"
+
+# Konvertatsiya natijalari keshi (SHA-256 bo'yicha, LRU), megabaytda. 0 = o'chirilgan
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+
+# file_unique_id -> SHA-256 indeksining xotiradagi maksimal yozuvlar soni
+FILE_INDEX_MAX_ENTRIES = int(os.getenv("FILE_INDEX_MAX_ENTRIES", "100000"))
+
+# Shu hajmgacha (MB) bo'lgan fayllar diskka yozilmasdan xotirada qayta ishlanadi. 0 = har doim disk
+IN_MEMORY_MAX_MB = float(os.getenv("IN_MEMORY_MAX_MB", "10"))
+
+# DOCX arxiv cheklovlari (parse qilishdan oldin tekshiriladi - zip-bomb himoyasi)
+DOCX_MAX_FILE_MB = float(os.getenv("DOCX_MAX_FILE_MB", "20"))  # Yuklanadigan fayl hajmi
+DOCX_MAX_UNCOMPRESSED_MB = float(os.getenv("DOCX_MAX_UNCOMPRESSED_MB", "200"))  # Arxiv ichidagi jami hajm
+DOCX_MAX_RATIO = float(os.getenv("DOCX_MAX_RATIO", "100"))  # Siqish koeffitsienti (ochilgan / siqilgan)
+DOCX_MAX_ENTRIES = int(os.getenv("DOCX_MAX_ENTRIES", "2000"))  # Arxivdagi fayllar soni
+
+# Bir vaqtda konvertatsiya qilinadigan fayllar soni: bitta buyurtma ichida va butun bot bo'yicha
+CONVERT_ORDER_CONCURRENCY = int(os.getenv("CONVERT_ORDER_CONCURRENCY", "3"))
+CONVERT_GLOBAL_CONCURRENCY = int(os.getenv("CONVERT_GLOBAL_CONCURRENCY", "0")) or CONVERT_WORKERS * 2  # 0 = workerlar x 2
+
+# Konvertatsiya navbati (conversion_jobs jadvali). 1 = to'lovdan keyin fayllar alohida worker.py ga uzatiladi
+CONVERT_QUEUE = os.getenv("CONVERT_QUEUE", "0") == "1"
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", "600"))  # Shu vaqtdan (sekund) keyin "running" job qayta olinadi
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))  # Navbat bo'sh bo'lsa kutish (sekund)
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "0")) or CONVERT_WORKERS  # Bitta worker bir vaqtda oladigan joblar
+
+# Konvertatsiya navbati ustuvorlik sinflari og'irligi (weighted round-robin): "admin:4,paid:2,retry:1"
+SCHEDULER_WEIGHTS = {
+    name.strip(): int(weight)
+    for name, weight in (item.split(":") for item in os.getenv("SCHEDULER_WEIGHTS", "admin:4,paid:2,retry:1").split(","))
+}
+
+
+def _parse_throttle(value: str) -> tuple:
+    """ "20/60:10" -> (sekundiga tiklanish, burst): 60 sekundda 20 ta so'rov, birdaniga 10 tagacha"""
+    rate, _, burst = value.partition(":")
+    count, _, period = rate.partition("/")
+    return float(count) / float(period or 1), float(burst or count)
+
+
+# Har bir user uchun so'rovlar chegarasi (token bucket): "soni/sekund:burst"
+THROTTLE_RULES = {
+    "upload": _parse_throttle(os.getenv("THROTTLE_UPLOAD", "30/60:15")),  # DOCX yuborish (albom 10 tagacha)
+    "callback": _parse_throttle(os.getenv("THROTTLE_CALLBACK", "60/60:20")),  # Tugmalar
+    "promo": _parse_throttle(os.getenv("THROTTLE_PROMO", "5/300:3")),  # Promokod kiritish urinishlari
+    "message": _parse_throttle(os.getenv("THROTTLE_MESSAGE", "30/60:10")),  # Boshqa xabarlar (/start va h.k.)
+}
+
+# Locale fayllari o'zgarishini tekshirish oralig'i (sekund). 0 = faqat ishga tushganda yuklanadi
+LOCALE_RELOAD_INTERVAL = float(os.getenv("LOCALE_RELOAD_INTERVAL", "0"))
+
+# Kanal obunasi keshi (sekund): obuna bo'lganlar / bo'lmaganlar uchun alohida muddat
+SUBSCRIPTION_TTL = float(os.getenv("SUBSCRIPTION_TTL", "600"))
+SUBSCRIPTION_NEGATIVE_TTL = float(os.getenv("SUBSCRIPTION_NEGATIVE_TTL", "20"))
+SUBSCRIPTION_CACHE_SIZE = int(os.getenv("SUBSCRIPTION_CACHE_SIZE", "100000"))  # Keshdagi userlar soni chegarasi
+
+# Kanal a'zolari indeksini API orqali davriy solishtirish (chat_member updatelari o'tkazib yuborilgan bo'lsa)
+MEMBERSHIP_RECONCILE_INTERVAL = float(os.getenv("MEMBERSHIP_RECONCILE_INTERVAL", "300"))  # Sikl oralig'i (sekund), 0 = o'chirilgan
+MEMBERSHIP_RECONCILE_BATCH = int(os.getenv("MEMBERSHIP_RECONCILE_BATCH", "100"))  # Bir siklda tekshiriladigan userlar
+MEMBERSHIP_STALE_AFTER = float(os.getenv("MEMBERSHIP_STALE_AFTER", "21600"))  # Shuncha sekund tekshirilmagan yozuv qayta so'raladi
+
+# User profili keshi (til, balans, referal kod) - navigatsiya DB ga murojaat qilmasligi uchun
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "50000"))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))  # Boshqa instance'dagi o'zgarishlar shu vaqtda ko'rinadi
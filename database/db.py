@@ -1,7 +1,11 @@
 import os
+import time
+from collections import deque
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 # .env yoki .env.development dan o‘qish
 if os.path.exists(".env.development"):
@@ -23,10 +27,101 @@ pg_password_enc = quote_plus(pg_password)
 # PostgreSQL DSN
 DATABASE_URL = f"postgresql+asyncpg://{pg_user_enc}:{pg_password_enc}@{pg_host}:{pg_port}/{pg_db}"
 
+# Connection pool parametrlari (bot + worker slotlari soniga qarab sozlanadi)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Bo'sh ulanish kutish chegarasi (sekund)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Shuncha sekunddan eski ulanish qayta ochiladi
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"  # Uzilgan ulanishni ishlatishdan oldin tekshirish
+# asyncpg prepared statement keshi (pgbouncer transaction rejimida 0 bo'lishi kerak)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_POOL_WAIT_WARN_MS = float(os.getenv("DB_POOL_WAIT_WARN_MS", "100"))  # Bundan uzoq kutish logga yoziladi
+
+# Kutish vaqti statistikasi uchun oxirgi o'lchovlar soni
+WAIT_SAMPLES = 1000
+
+
+class PoolWaitStats:
+    """Pooldan ulanish olishda kutilgan vaqtlar (ms)"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.slow = 0
+        self.timeouts = 0  # Faqat pool_timeout tugashi (pool kichik)
+        self.errors = 0  # Boshqa xatolar (masalan, yangi ulanish ochilmadi)
+        self.max_wait = 0.0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    def record(self, wait_ms: float, error: BaseException | None = None):
+        self.checkouts += 1
+        self.max_wait = max(self.max_wait, wait_ms)
+        self._waits.append(wait_ms)
+        if isinstance(error, PoolTimeoutError):
+            self.timeouts += 1
+        elif error is not None:
+            self.errors += 1
+        if wait_ms >= DB_POOL_WAIT_WARN_MS:
+            self.slow += 1
+            print(f"⚠️ DB pool: ulanish {wait_ms:.0f} ms kutildi (checked out: {engine.pool.checkedout()})")
+
+    def percentile(self, fraction: float) -> float:
+        if not self._waits:
+            return 0.0
+        ordered = sorted(self._waits)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Ulanish olish (checkout) vaqtini o'lchaydigan pool"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except BaseException as e:
+            pool_wait_stats.record((time.perf_counter() - start) * 1000, e)
+            raise
+        pool_wait_stats.record((time.perf_counter() - start) * 1000)
+        return connection
+
+
 # SQLAlchemy engine va session
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+engine = create_async_engine(
+    # SQLAlchemy darajasidagi prepared statement keshi (URL parametri)
+    f"{DATABASE_URL}?prepared_statement_cache_size={DB_STATEMENT_CACHE_SIZE}",
+    echo=False,
+    future=True,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+def get_pool_stats() -> dict:
+    """Pool holati va checkout kutish statistikasi (admin statistikasi uchun)"""
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checkouts": pool_wait_stats.checkouts,
+        "slow": pool_wait_stats.slow,
+        "timeouts": pool_wait_stats.timeouts,
+        "errors": pool_wait_stats.errors,
+        "wait_p50": pool_wait_stats.percentile(0.50),
+        "wait_p95": pool_wait_stats.percentile(0.95),
+        "wait_max": pool_wait_stats.max_wait,
+    }
+
 # Session generator (dependency uchun)
 async def get_session():
     async with AsyncSessionLocal() as session:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, BigInteger, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, BigInteger, DateTime, Float, ForeignKey, JSON, UniqueConstraint
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from datetime import datetime
@@ -17,7 +17,8 @@ class User(Base):
     
     # Referral system
     referral_code = Column(String(20), unique=True, index=True, nullable=True)
-    referred_by = Column(BigInteger, ForeignKey("users.telegram_id"), nullable=True)
+    referred_by = Column(BigInteger, ForeignKey("users.telegram_id"), index=True, nullable=True)
+    referral_count = Column(Integer, default=0)  # Taklif qilgan userlar soni (ReferralHistory bilan birga yangilanadi)
     balance = Column(Float, default=0.0)
     total_earned = Column(Float, default=0.0)  # Jami ishlab topgan pul
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -69,8 +70,63 @@ class Promocode(Base):
 
 class PromocodeUsage(Base):
     __tablename__ = "promocode_usage"
+    # Bitta user bitta promokodni faqat bir marta ishlatadi (parallel so'rovlarda ham)
+    __table_args__ = (UniqueConstraint("promocode_id", "user_id", name="uq_promocode_usage_user"),)
     id = Column(Integer, primary_key=True)
     promocode_id = Column(Integer, ForeignKey("promocodes.id"), index=True)
     user_id = Column(BigInteger, ForeignKey("users.telegram_id"), index=True)
     reward_amount = Column(Float)
     used_at = Column(DateTime, default=datetime.utcnow)
+
+
+class FileIndex(Base):
+    __tablename__ = "file_index"
+    id = Column(Integer, primary_key=True)
+    file_unique_id = Column(String, unique=True, index=True)  # Telegram file_unique_id
+    sha256 = Column(String(64), index=True)  # Fayl tarkibi hash'i (natija keshi kaliti)
+    file_size = Column(BigInteger, nullable=True)
+    analysis = Column(JSON, nullable=True)  # analyze_docx_file natijasi
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ConversionJob(Base):
+    __tablename__ = "conversion_jobs"
+    id = Column(Integer, primary_key=True)
+    order_key = Column(String, index=True)  # Bitta buyurtmadagi fayllar uchun umumiy kalit
+    position = Column(Integer, default=0)  # Fayl buyurtmadagi tartibi
+    telegram_id = Column(BigInteger, index=True)
+    chat_id = Column(BigInteger)
+    lang = Column(String(3), default="uz")
+    file_path = Column(String)  # Umumiy papkadagi DOCX (yo'q bo'lsa file_id orqali yuklanadi)
+    file_id = Column(String, nullable=True)  # Telegram file_id
+    digest = Column(String(64), nullable=True)  # SHA-256 (natija keshi uchun)
+    formats = Column(JSON, nullable=True)  # Chiqish formatlari
+    priority = Column(String(16), default="paid")  # Ustuvorlik sinfi: admin, paid (handlers.scheduler)
+    status = Column(String(16), default="queued", index=True)  # queued, running, done, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    last_error = Column(String, nullable=True)
+    run_after = Column(DateTime, default=datetime.utcnow)  # Qayta urinish vaqti
+    locked_at = Column(DateTime, nullable=True)  # Worker olgan vaqt
+    worker_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ChannelMember(Base):
+    __tablename__ = "channel_members"
+    telegram_id = Column(BigInteger, primary_key=True)
+    is_member = Column(Boolean, default=False)
+    status = Column(String(16), nullable=True)  # creator, administrator, member, left, kicked, ...
+    checked_at = Column(DateTime, default=datetime.utcnow, index=True)  # Oxirgi tasdiqlangan vaqt (update yoki API)
+
+
+class BalanceLedger(Base):
+    __tablename__ = "balance_ledger"
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(BigInteger, ForeignKey("users.telegram_id"), index=True)
+    amount = Column(Float)  # Musbat - kirim, manfiy - chiqim
+    balance_after = Column(Float)  # Amaldan keyingi balans
+    reason = Column(String(32))  # payment, partial_payment, promo, referral
+    reference = Column(String, nullable=True)  # invoice_id, promokod, taklif qilingan user
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -5,8 +5,17 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy import select, update
 from database.models import Settings
-from database.db import get_session
-from config import ADMIN_ID, FILE_PRICE
+from database.db import get_session, get_pool_stats
+from config import ADMIN_ID, FILE_PRICE, CONVERT_QUEUE
+from handlers.cache import conversion_cache
+from handlers.scheduler import conversion_scheduler
+from handlers.jobs import get_queue_stats, QUEUED, RUNNING, FAILED
+from handlers.settings_store import settings_store, SettingsSnapshot
+from handlers.subscription import subscription_cache
+from handlers.membership import membership_index
+from handlers.orders import pending_orders
+from handlers.profiles import user_profiles
+from middlewares.throttling import limiter
 
 
 class AdminStates(StatesGroup):
@@ -37,6 +46,7 @@ async def admin_settings_handler(callback: CallbackQuery):
         [InlineKeyboardButton(text="🎁 Referal Mukofoti", callback_data="admin_referral")],
         [InlineKeyboardButton(text="📊 Referal Statistika", callback_data="admin_referral_stats")],
         [InlineKeyboardButton(text="� Promokodlar", callback_data="admin_promo_menu")],
+        [InlineKeyboardButton(text="📈 Tizim Statistikasi", callback_data="admin_stats")],
         [InlineKeyboardButton(text="�🏠 Asosiy Menyu", callback_data="back_to_menu")],
     ])
 
@@ -55,15 +65,7 @@ async def admin_offer_handler(callback: CallbackQuery):
         await callback.answer("⛔ Sizda bu bo'limga kirish huquqi yo'q.", show_alert=True)
         return
 
-    async for session in get_session():
-        stmt = select(Settings).limit(1)
-        result = await session.execute(stmt)
-        settings = result.scalar_one_or_none()
-
-        if not settings:
-            settings = Settings(uz_offer="", ru_offer="", en_offer="")
-            session.add(settings)
-            await session.commit()
+    settings = settings_store.get()
 
     uz_offer = settings.uz_offer or "❌ Belgilanmagan"
     ru_offer = settings.ru_offer or "❌ Belgilanmagan"
@@ -151,16 +153,15 @@ async def receive_link(message: Message, state: FSMContext):
                 settings.en_offer = link
             
             await session.commit()
-            
-            # Yangilangan sozlamalarni o'qib olamiz
-            result = await session.execute(stmt)
-            updated_settings = result.scalar_one_or_none()
+        
+        # Xotiradagi sozlamalar va oferta ekrani yangilanadi, boshqa instance'larga NOTIFY
+        await settings_store.changed()
         
         lang_name = {"uz": "O'zbek", "ru": "Русский", "en": "English"}.get(lang)
         await message.answer(f"✅ {lang_name} oferta linki muvaffaqiyatli saqlandi!\n🔗 {link}")
         
         # Oferta menyusini qayta chiqaramiz
-        await show_offer_menu(message, updated_settings)
+        await show_offer_menu(message, settings_store.get())
     
     except Exception as e:
         await message.answer(f"❌ Xatolik: {e}")
@@ -169,7 +170,7 @@ async def receive_link(message: Message, state: FSMContext):
         await state.clear()
 
 
-async def show_offer_menu(message: Message, settings: Settings):
+async def show_offer_menu(message: Message, settings: SettingsSnapshot):
     """Oferta sozlamalar menyusini ko'rsatadi"""
     uz_offer = settings.uz_offer or "❌ Belgilanmagan"
     ru_offer = settings.ru_offer or "❌ Belgilanmagan"
@@ -258,8 +259,74 @@ async def edit_price_handler(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_stats")
 async def admin_stats_handler(callback: CallbackQuery):
     """Statistika ko'rsatadi"""
-    text = "📊 *Statistika*\n\n🔄 Tez orada..."
-    await callback.message.answer(text, parse_mode="Markdown")
+    if callback.from_user.id != ADMIN_ID:
+        await callback.answer("⛔ Sizda bu bo'limga kirish huquqi yo'q.", show_alert=True)
+        return
+    
+    cache = conversion_cache.stats()
+    scheduler = conversion_scheduler.stats()
+    throttling = limiter.stats()
+    subscription = subscription_cache.stats()
+    membership = membership_index.stats()
+    pool = get_pool_stats()
+    profiles = user_profiles.stats()
+    orders = pending_orders.stats()
+    
+    job_lines = ""
+    if CONVERT_QUEUE:
+        try:
+            jobs = await get_queue_stats()
+            counts = jobs["counts"]
+            job_lines = (
+                f"📥 Navbat (worker): kutmoqda {counts.get(QUEUED, 0)} | ishlanmoqda {counts.get(RUNNING, 0)} | "
+                f"xato {counts.get(FAILED, 0)}, eng eski {jobs['oldest_wait']:.0f}s\n"
+            )
+        except Exception as e:
+            print(f"Navbat statistikasini olishda xatolik: {e}")
+    
+    queue_lines = "".join(
+        f"• {name}: navbat {cls['depth']} ({cls['users']} user), kutish p50 {cls['wait_p50']:.1f}s / p95 {cls['wait_p95']:.1f}s\n"
+        for name, cls in scheduler["classes"].items()
+    )
+    
+    text = (
+        "📊 *Statistika*\n\n"
+        "🗂 *Konvertatsiya keshi*\n"
+        f"📦 Yozuvlar: {cache['entries']}\n"
+        f"💾 Hajm: {cache['size'] / 1024 / 1024:.1f} / {cache['max_size'] / 1024 / 1024:.0f} MB\n"
+        f"✅ Hit: {cache['hits']} | ❌ Miss: {cache['misses']} ({cache['hit_rate']:.0%})\n"
+        f"🗑 Chiqarib yuborilgan: {cache['evictions']}\n\n"
+        "⚙️ *Konvertatsiya navbati*\n"
+        f"🔄 Ishlanmoqda: {scheduler['active']} / {scheduler['capacity']} | ⏳ Kutmoqda: {scheduler['waiting']}\n"
+        f"✅ Jami berilgan slotlar: {scheduler['granted']}\n"
+        f"{queue_lines}"
+        f"{job_lines}"
+        f"🧾 To'lov kutayotgan buyurtmalar: {orders['orders']} (invoice: {orders['invoices']})\n\n"
+        "🚦 *So'rovlar chegarasi*\n"
+        f"🪣 Faol bucketlar: {throttling['buckets']} | ⛔ Rad etilgan: {throttling['rejected']}\n\n"
+        "📢 *Obuna keshi*\n"
+        f"👥 Yozuvlar: {subscription['entries']} | 🔄 So'rovda: {subscription['inflight']}\n"
+        f"✅ Hit: {subscription['hits']} | ❌ Miss: {subscription['misses']}\n"
+        f"📇 A'zolar indeksi: {membership['members']} / {membership['known']} | "
+        f"🔔 Updatelar: {membership['updates']} | 🔁 Solishtirilgan: {membership['reconciled']}\n\n"
+        "👤 *Profil keshi*\n"
+        f"📦 Yozuvlar: {profiles['entries']} | ✅ Hit: {profiles['hits']} | ❌ Miss: {profiles['misses']} ({profiles['hit_rate']:.0%})\n\n"
+        "🗄 *DB pool*\n"
+        f"🔌 Band: {pool['checked_out']} | Bo'sh: {pool['idle']} | "
+        f"Hajm: {pool['size']} (+{pool['overflow']}/{pool['max_overflow']} overflow)\n"
+        f"⏱ Kutish p50 {pool['wait_p50']:.1f} ms / p95 {pool['wait_p95']:.1f} ms / max {pool['wait_max']:.0f} ms\n"
+        f"🐢 Sekin: {pool['slow']} | ⛔ Timeout: {pool['timeouts']} | ❗ Xato: {pool['errors']} | Jami: {pool['checkouts']}"
+    )
+    
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔄 Yangilash", callback_data="admin_stats")],
+        [InlineKeyboardButton(text="◀️ Orqaga", callback_data="admin_settings")],
+    ])
+    
+    try:
+        await callback.message.edit_text(text, reply_markup=kb, parse_mode="Markdown")
+    except:
+        await callback.message.answer(text, reply_markup=kb, parse_mode="Markdown")
     await callback.answer()
 
 
@@ -279,22 +346,7 @@ async def admin_referral_handler(callback: CallbackQuery):
         await callback.answer("⛔ Sizda bu bo'limga kirish huquqi yo'q.", show_alert=True)
         return
 
-    async for session in get_session():
-        stmt = select(Settings).limit(1)
-        result = await session.execute(stmt)
-        settings = result.scalar_one_or_none()
-        
-        if not settings:
-            settings = Settings(
-                uz_offer="", 
-                ru_offer="", 
-                en_offer="",
-                referral_reward=1000.0
-            )
-            session.add(settings)
-            await session.commit()
-        
-        current_reward = settings.referral_reward or 1000.0
+    current_reward = settings_store.get().referral_reward or 1000.0
 
     text = (
         "🎁 *Referal Mukofoti Sozlamalari*\n\n"
@@ -369,6 +421,8 @@ async def receive_referral_reward(message: Message, state: FSMContext):
             
             await session.commit()
         
+        await settings_store.changed()
+        
         await message.answer(
             f"✅ Referal mukofot miqdori muvaffaqiyatli o'zgartirildi!\n\n"
             f"💰 Yangi mukofot: {new_reward:,.0f} UZS\n\n"
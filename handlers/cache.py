@@ -0,0 +1,91 @@
+from collections import OrderedDict
+
+from config import RESULT_CACHE_MAX_MB
+
+# Tahlil natijasi uchun taxminiy o'lcham (bayt)
+ANALYSIS_OVERHEAD = 512
+
+
+class ConversionCache:
+    """
+    DOCX baytlarining SHA-256 qiymati bo'yicha tahlil va tayyor natijalarni saqlaydigan LRU kesh.
+    
+    Bir xil fayl qayta yuborilsa, parse va konvertatsiya umuman bajarilmaydi.
+    Umumiy hajm max_bytes dan oshsa, eng uzoq ishlatilmagan yozuvlar o'chiriladi.
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # digest -> {"analysis": dict | None, "outputs": {format: bytes}, "size": int}
+        self._entries: OrderedDict = OrderedDict()
+    
+    def _lookup(self, digest: str, field: str, fmt: str | None = None):
+        entry = self._entries.get(digest)
+        value = None
+        if entry is not None:
+            value = entry["outputs"].get(fmt) if fmt else entry[field]
+        
+        if value is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self._entries.move_to_end(digest)
+        return value
+    
+    def _entry(self, digest: str) -> dict:
+        entry = self._entries.get(digest)
+        if entry is None:
+            entry = {"analysis": None, "outputs": {}, "size": ANALYSIS_OVERHEAD}
+            self._entries[digest] = entry
+            self.size += entry["size"]
+        self._entries.move_to_end(digest)
+        return entry
+    
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.size -= entry["size"]
+            self.evictions += 1
+    
+    def get_analysis(self, digest: str) -> dict | None:
+        return self._lookup(digest, "analysis")
+    
+    def get_output(self, digest: str, fmt: str = "txt") -> bytes | None:
+        return self._lookup(digest, "outputs", fmt)
+    
+    def put_analysis(self, digest: str, analysis: dict):
+        if self.max_bytes <= 0:
+            return
+        self._entry(digest)["analysis"] = analysis
+        self._evict()
+    
+    def put_output(self, digest: str, fmt: str, data: bytes):
+        if self.max_bytes <= 0 or len(data) > self.max_bytes:
+            return
+        entry = self._entry(digest)
+        old = entry["outputs"].get(fmt)
+        delta = len(data) - (len(old) if old is not None else 0)
+        entry["outputs"][fmt] = data
+        entry["size"] += delta
+        self.size += delta
+        self._evict()
+    
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+conversion_cache = ConversionCache(int(RESULT_CACHE_MAX_MB * 1024 * 1024))
@@ -1,26 +1,44 @@
+import io
+
 from docx import Document
 from docx.oxml.text.paragraph import CT_P
 from docx.oxml.table import CT_Tbl
 from docx.table import _Cell, Table
 from docx.text.paragraph import Paragraph
 
+from config import DOCX_STREAMING
+from handlers.docx_stream import count_cell_media, iter_docx_rows
+from handlers.writers import render_formats
+
+
+def _open_source(source):
+    """Fayl yo'li yoki xotiradagi baytlarni python-docx/zipfile qabul qiladigan ko'rinishga keltiradi"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
 
-def analyze_docx_file(docx_path: str) -> dict:
+
+def parse_docx_file(docx_path) -> dict:
     """
-    DOCX faylni tahlil qilib, rasm, formula va boshqa muammolarni aniqlaydi.
+    DOCX faylni bir marta o'qib, savol-javoblar va tahlilni birga qaytaradi.
+    
+    docx_path - fayl yo'li yoki xotiradagi DOCX baytlari.
+    
+    Natija pending buyurtmada saqlanadi, shuning uchun to'lovdan keyingi
+    konvertatsiya faylni qayta parse qilmaydi.
     
     Returns:
         {
-            'total_questions': int,
-            'has_images': bool,
-            'has_equations': bool,
-            'image_count': int,
-            'equation_count': int,
-            'problematic_questions': list  # Rasm/formula bor savol raqamlari
+            'questions': list,  # [(savol, [javob1, javob2, ...]), ...]
+            'analysis': dict    # analyze_docx_file() natijasi bilan bir xil
         }
     """
-    doc = Document(docx_path)
+    if DOCX_STREAMING:
+        return parse_docx_streaming(docx_path)
     
+    doc = Document(_open_source(docx_path))
+    
+    questions = []
     total_questions = 0
     has_images = False
     has_equations = False
@@ -32,83 +50,174 @@ def analyze_docx_file(docx_path: str) -> dict:
     
     for table in doc.tables:
         for row in table.rows:
-            question = row.cells[0].text.strip()
+            # row.cells har chaqiruvda qayta hisoblanadi - bir marta olamiz
+            cells = row.cells
+            question = cells[0].text.strip()
+            
+            if not question:
+                continue
+            
+            question_num += 1
+            total_questions += 1
+            
+            # Qolgan ustunlar - javoblar
+            answers = [cell.text.strip() for cell in cells[1:]]
+            questions.append((question, answers))
             
-            if question:
-                question_num += 1
-                total_questions += 1
-                
-                # Har bir katakda rasm yoki formula tekshirish
-                question_has_problem = False
-                
-                for cell in row.cells:
-                    # Rasmlarni tekshirish
-                    for paragraph in cell.paragraphs:
-                        # Inline shapes (rasmlar)
-                        if paragraph._element.xpath('.//w:drawing'):
-                            has_images = True
-                            image_count += 1
-                            question_has_problem = True
-                        
-                        # OLE objects (formula kabi)
-                        if paragraph._element.xpath('.//w:object'):
-                            has_equations = True
-                            equation_count += 1
-                            question_has_problem = True
-                        
-                        # Math equations (MathML)
-                        if paragraph._element.xpath('.//m:oMath'):
-                            has_equations = True
-                            equation_count += 1
-                            question_has_problem = True
-                
-                if question_has_problem:
-                    problematic_questions.append(question_num)
+            # Har bir katakda rasm (w:drawing) yoki formula (w:object, m:oMath) tekshirish.
+            # Birlashgan katak row.cells da takrorlanadi - uni bir marta aylanib, natijani qayta ishlatamiz
+            row_images = 0
+            row_equations = 0
+            media_by_tc = {}
+            
+            for cell in cells:
+                tc = cell._tc
+                media = media_by_tc.get(id(tc))
+                if media is None:
+                    media = media_by_tc[id(tc)] = count_cell_media(tc)
+                row_images += media[0]
+                row_equations += media[1]
+            
+            if row_images:
+                has_images = True
+                image_count += row_images
+            if row_equations:
+                has_equations = True
+                equation_count += row_equations
+            if row_images or row_equations:
+                problematic_questions.append(question_num)
+    
+    return {
+        'questions': questions,
+        'analysis': {
+            'total_questions': total_questions,
+            'has_images': has_images,
+            'has_equations': has_equations,
+            'image_count': image_count,
+            'equation_count': equation_count,
+            'problematic_questions': problematic_questions
+        }
+    }
+
+
+def parse_docx_streaming(docx_path) -> dict:
+    """
+    parse_docx_file ning oqimli (iterparse) varianti - python-docx DOM qurilmaydi.
+    
+    Natija formati parse_docx_file bilan bir xil.
+    """
+    questions = []
+    image_count = 0
+    equation_count = 0
+    has_images = False
+    has_equations = False
+    problematic_questions = []
+    
+    for question, answers, images, equations in iter_docx_rows(_open_source(docx_path)):
+        questions.append((question, answers))
+        
+        if images:
+            has_images = True
+            image_count += images
+        if equations:
+            has_equations = True
+            equation_count += equations
+        if images or equations:
+            problematic_questions.append(len(questions))
     
     return {
-        'total_questions': total_questions,
-        'has_images': has_images,
-        'has_equations': has_equations,
-        'image_count': image_count,
-        'equation_count': equation_count,
-        'problematic_questions': problematic_questions
+        'questions': questions,
+        'analysis': {
+            'total_questions': len(questions),
+            'has_images': has_images,
+            'has_equations': has_equations,
+            'image_count': image_count,
+            'equation_count': equation_count,
+            'problematic_questions': problematic_questions
+        }
     }
 
 
-def convert_docx_to_txt(docx_path: str, txt_path: str) -> str:
+def analyze_docx_file(docx_path) -> dict:
+    """
+    DOCX faylni tahlil qilib, rasm, formula va boshqa muammolarni aniqlaydi.
+    
+    Returns:
+        {
+            'total_questions': int,
+            'has_images': bool,
+            'has_equations': bool,
+            'image_count': int,
+            'equation_count': int,
+            'problematic_questions': list  # Rasm/formula bor savol raqamlari
+        }
+    """
+    return parse_docx_file(docx_path)['analysis']
+
+
+def write_questions_txt(questions: list, file) -> None:
+    """Savol-javoblarni (ro'yxat yoki generator) ochiq fayl obyektiga TXT formatda yozadi"""
+    for question, answers in questions:
+        file.write(f"? {question}\n")
+        
+        # Birinchi javob - to'g'ri javob (+)
+        if len(answers) > 0 and answers[0]:
+            file.write(f"+ {answers[0]}\n")
+        
+        # Qolgan javoblar - noto'g'ri javoblar (-)
+        for ans in answers[1:]:
+            if ans:  # Bo'sh bo'lmasa
+                file.write(f"- {ans}\n")
+        
+        file.write("\n")  # Har bir savol-javobdan keyin bo'sh qator
+
+
+def _iter_questions(docx_path, parsed: dict | None):
+    """Savol-javoblarni parse natijasidan yoki fayldan (oqim rejimida - generator) oladi"""
+    if parsed is not None:
+        return parsed['questions']
+    if DOCX_STREAMING:
+        # Oqim rejimi: savollar xotirada yig'ilmasdan to'g'ridan-to'g'ri yoziladi
+        return ((question, answers) for question, answers, _, _ in iter_docx_rows(_open_source(docx_path)))
+    return parse_docx_file(docx_path)['questions']
+
+
+def convert_docx_to_txt(docx_path: str, txt_path: str, parsed: dict | None = None) -> str:
     """
     DOCX fayldan savol-javoblarni extract qilib TXT ga yozadi.
     
+    Agar parsed (parse_docx_file natijasi) berilsa, fayl qayta o'qilmaydi.
+    
     Format:
     ? Savol matni
     + To'g'ri javob
     - Noto'g'ri javob 1
     - Noto'g'ri javob 2
     """
-    doc = Document(docx_path)
-    
     with open(txt_path, 'w', encoding='utf-8') as file:
-        # Jadvallardagi savol-javoblarni extract qilish
-        for table in doc.tables:
-            for row in table.rows:
-                # Birinchi ustun - savol
-                question = row.cells[0].text.strip()
-                
-                # Qolgan ustunlar - javoblar
-                answers = [cell.text.strip() for cell in row.cells[1:]]
-                
-                if question:  # Faqat savol bo'lsa yozamiz
-                    file.write(f"? {question}\n")
-                    
-                    # Birinchi javob - to'g'ri javob (+)
-                    if len(answers) > 0 and answers[0]:
-                        file.write(f"+ {answers[0]}\n")
-                    
-                    # Qolgan javoblar - noto'g'ri javoblar (-)
-                    for ans in answers[1:]:
-                        if ans:  # Bo'sh bo'lmasa
-                            file.write(f"- {ans}\n")
-                    
-                    file.write("\n")  # Har bir savol-javobdan keyin bo'sh qator
+        write_questions_txt(_iter_questions(docx_path, parsed), file)
     
     return txt_path
+
+
+def convert_docx_to_bytes(source, parsed: dict | None = None) -> bytes:
+    """
+    convert_docx_to_txt ning xotiradagi varianti: diskka hech narsa yozilmaydi.
+    
+    source - fayl yo'li yoki DOCX baytlari (parsed berilsa None bo'lishi mumkin).
+    """
+    buffer = io.StringIO()
+    write_questions_txt(_iter_questions(source, parsed), buffer)
+    return buffer.getvalue().encode('utf-8')
+
+
+def convert_docx_to_formats(source, formats, parsed: dict | None = None) -> dict:
+    """
+    Bitta parse (yoki oqim) natijasidan bir nechta formatni birga yaratadi.
+    
+    formats - handlers.writers.WRITERS kalitlari (txt, jsonl, csv, moodle, gift).
+    
+    Returns:
+        {format: bytes}
+    """
+    return render_formats(_iter_questions(source, parsed), formats)
@@ -0,0 +1,213 @@
+import posixpath
+import zipfile
+
+from lxml import etree
+
+# DOCX ichidagi XML namespace'lar
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+M_NS = "http://schemas.openxmlformats.org/officeDocument/2006/math"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+W_BODY = f"{{{W_NS}}}body"
+W_TBL = f"{{{W_NS}}}tbl"
+W_TR = f"{{{W_NS}}}tr"
+W_TC = f"{{{W_NS}}}tc"
+W_P = f"{{{W_NS}}}p"
+W_R = f"{{{W_NS}}}r"
+W_HYPERLINK = f"{{{W_NS}}}hyperlink"
+W_TRPR = f"{{{W_NS}}}trPr"
+W_TCPR = f"{{{W_NS}}}tcPr"
+W_GRID_BEFORE = f"{{{W_NS}}}gridBefore"
+W_GRID_SPAN = f"{{{W_NS}}}gridSpan"
+W_VMERGE = f"{{{W_NS}}}vMerge"
+W_VAL = f"{{{W_NS}}}val"
+W_TYPE = f"{{{W_NS}}}type"
+W_DRAWING = f"{{{W_NS}}}drawing"
+W_OBJECT = f"{{{W_NS}}}object"
+M_OMATH = f"{{{M_NS}}}oMath"
+# Rasm/formula aniqlash uchun teglar (lxml iter() ga bir marta uzatiladi)
+MEDIA_TAGS = (W_DRAWING, W_OBJECT, M_OMATH)
+
+# Run ichidagi matn elementlari (python-docx Run.text bilan bir xil)
+W_T = f"{{{W_NS}}}t"
+W_TAB = f"{{{W_NS}}}tab"
+W_PTAB = f"{{{W_NS}}}ptab"
+W_BR = f"{{{W_NS}}}br"
+W_CR = f"{{{W_NS}}}cr"
+W_NO_BREAK_HYPHEN = f"{{{W_NS}}}noBreakHyphen"
+
+
+def _main_document_name(archive: zipfile.ZipFile) -> str:
+    """Asosiy hujjat qismining zip ichidagi nomini topadi (odatda word/document.xml)"""
+    try:
+        rels = etree.fromstring(archive.read("_rels/.rels"))
+        for rel in rels.iter(f"{{{REL_NS}}}Relationship"):
+            if rel.get("Type") == OFFICE_DOCUMENT_REL:
+                return posixpath.normpath(rel.get("Target").lstrip("/"))
+    except KeyError:
+        pass
+    return "word/document.xml"
+
+
+def _run_text(run) -> str:
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == W_T:
+            parts.append(child.text or "")
+        elif tag in (W_TAB, W_PTAB):
+            parts.append("\t")
+        elif tag == W_CR:
+            parts.append("\n")
+        elif tag == W_BR:
+            # Sahifa/ustun uzilishi matn bermaydi
+            if child.get(W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag == W_NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+
+def _paragraph_text(p) -> str:
+    parts = []
+    for child in p:
+        if child.tag == W_R:
+            parts.append(_run_text(child))
+        elif child.tag == W_HYPERLINK:
+            parts.extend(_run_text(r) for r in child.iterchildren(W_R))
+    return "".join(parts)
+
+
+def _paragraph_media(p) -> tuple:
+    """
+    Paragrafdagi (rasm, formula) sonini bitta daraxt aylanishida hisoblaydi.
+
+    Hisoblash eski uchta XPath bilan bir xil: har bir tur paragraf uchun
+    ko'pi bilan bir marta sanaladi (w:drawing - rasm, w:object va m:oMath - formula).
+    """
+    kinds = set()
+    for el in p.iter(*MEDIA_TAGS):
+        kinds.add(el.tag)
+        if len(kinds) == 3:
+            break
+
+    if not kinds:
+        return 0, 0
+    return int(W_DRAWING in kinds), int(W_OBJECT in kinds) + int(M_OMATH in kinds)
+
+
+def count_cell_media(tc) -> tuple:
+    """Katakning bevosita paragraflaridagi (rasm, formula) soni"""
+    images = 0
+    equations = 0
+    for p in tc.iterchildren(W_P):
+        p_images, p_equations = _paragraph_media(p)
+        images += p_images
+        equations += p_equations
+    return images, equations
+
+
+def _read_cell(tc) -> tuple:
+    """Katak matni va undagi rasm/formula sonini qaytaradi"""
+    texts = [_paragraph_text(p) for p in tc.iterchildren(W_P)]
+    images, equations = count_cell_media(tc)
+    return "\n".join(texts), images, equations
+
+
+def _cell_props(tc) -> tuple:
+    """(gridSpan, vMerge) qiymatlarini qaytaradi"""
+    tc_pr = tc.find(W_TCPR)
+    if tc_pr is None:
+        return 1, None
+
+    grid_span = 1
+    span = tc_pr.find(W_GRID_SPAN)
+    if span is not None:
+        grid_span = int(span.get(W_VAL, "1"))
+
+    v_merge = None
+    merge = tc_pr.find(W_VMERGE)
+    if merge is not None:
+        v_merge = merge.get(W_VAL, "continue")
+
+    return grid_span, v_merge
+
+
+def _grid_before(tr) -> int:
+    tr_pr = tr.find(W_TRPR)
+    if tr_pr is None:
+        return 0
+    grid_before = tr_pr.find(W_GRID_BEFORE)
+    return int(grid_before.get(W_VAL, "0")) if grid_before is not None else 0
+
+
+def iter_docx_rows(source):
+    """
+    word/document.xml ni zip ichidan oqim (iterparse) bilan o'qib, savol qatorlarini beradi.
+
+    Butun DOM qurilmaydi: har bir qator qayta ishlangach XML elementlari tozalanadi,
+    shuning uchun xotira hujjat hajmiga qarab o'smaydi.
+
+    Katak tartibi python-docx row.cells bilan bir xil: gorizontal birlashgan (gridSpan)
+    katak har bir ustun uchun takrorlanadi, vertikal davomi (vMerge) yuqoridagi katakni oladi.
+
+    Yields:
+        (savol, [javoblar], rasm_soni, formula_soni)
+    """
+    with zipfile.ZipFile(source) as archive:
+        with archive.open(_main_document_name(archive)) as xml:
+            # Joriy jadval va uning oldingi qatori grid ustunlari (vMerge uchun)
+            current_tbl = None
+            above = {}
+
+            for _, tr in etree.iterparse(xml, events=("end",), tag=W_TR, resolve_entities=False):
+                tbl = tr.getparent()
+                body = tbl.getparent() if tbl is not None else None
+
+                # Faqat hujjat tanasidagi jadvallar (doc.tables kabi); ichki jadvallar o'tkazib yuboriladi
+                if body is None or body.tag != W_BODY:
+                    continue
+
+                if tbl is not current_tbl:
+                    current_tbl = tbl
+                    above = {}
+
+                grid = {}
+                cells = []
+                offset = _grid_before(tr)
+
+                for tc in tr.iterchildren(W_TC):
+                    grid_span, v_merge = _cell_props(tc)
+
+                    if v_merge == "continue":
+                        cell = above.get(offset, ("", 0, 0))
+                    else:
+                        cell = _read_cell(tc)
+
+                    for _ in range(grid_span):
+                        cells.append(cell)
+                    grid[offset] = cell
+                    offset += grid_span
+
+                above = grid
+
+                # Qayta ishlangan elementlarni xotiradan tozalash
+                tr.clear()
+                while tr.getprevious() is not None:
+                    del tbl[0]
+                while tbl.getprevious() is not None:
+                    del body[0]
+
+                if not cells:
+                    continue
+
+                question = cells[0][0].strip()
+                if not question:
+                    continue
+
+                answers = [text.strip() for text, _, _ in cells[1:]]
+                images = sum(cell[1] for cell in cells)
+                equations = sum(cell[2] for cell in cells)
+
+                yield question, answers, images, equations
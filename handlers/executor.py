@@ -0,0 +1,100 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import signal
+
+from config import CONVERT_WORKERS, CONVERT_TIMEOUT
+
+# DOCX parse/konvertatsiya event loop'ni bloklamasligi uchun alohida processlarda bajariladi.
+# multiprocessing.Pool o'lgan workerni o'zi almashtiradi va boshqa workerlardagi joblarga tegmaydi
+# (ProcessPoolExecutor bitta worker o'lsa butun poolni "broken" qiladi).
+_pool = None
+# Worker -> bot: (token, pid) - job qaysi processda boshlanganini bilish uchun (timeout'da faqat o'shani o'ldiramiz)
+_started = None
+# token -> pid (boshlangan, natijasi hali kelmagan joblar)
+_running: dict = {}
+_tokens = itertools.count()
+
+# Worker process ichida: _started navbati (initializer o'rnatadi)
+_worker_started = None
+
+
+def _init_worker(started):
+    global _worker_started
+    _worker_started = started
+
+
+def _call(token: int, func, args: tuple):
+    """Worker ichida: jobni boshlaganini bildirib, funksiyani bajaradi"""
+    _worker_started.put((token, os.getpid()))
+    return func(*args)
+
+
+def get_pool():
+    """Joriy process poolni qaytaradi (kerak bo'lsa yaratadi)"""
+    global _pool, _started
+    if _pool is None:
+        _started = multiprocessing.SimpleQueue()
+        _pool = multiprocessing.Pool(CONVERT_WORKERS, initializer=_init_worker, initargs=(_started,))
+    return _pool
+
+
+def _drain_started():
+    """Workerlardan kelgan "boshlandi" xabarlarini _running ga o'tkazadi"""
+    while _started is not None and not _started.empty():
+        token, pid = _started.get()
+        _running[token] = pid
+
+
+def _kill_job(token: int):
+    """Timeout bo'lgan job bajarilayotgan workerni to'xtatadi - pool uning o'rniga yangisini ochadi"""
+    _drain_started()
+    pid = _running.pop(token, None)
+    if pid is None:
+        return  # Job hali boshlanmagan (navbatda) - to'xtatadigan process yo'q
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    except Exception as e:
+        print(f"Worker to'xtatishda xatolik: pid={pid}, error={e}")
+
+
+async def run_in_pool(func, *args, timeout: float | None = None):
+    """
+    Sinxron funksiyani process poolda bajaradi va natijani kutadi.
+
+    Timeout oshsa faqat shu job bajarilayotgan worker o'ldiriladi va TimeoutError ko'tariladi -
+    boshqa userlarning joblari o'z workerlarida davom etadi.
+    """
+    loop = asyncio.get_running_loop()
+    timeout = timeout or CONVERT_TIMEOUT
+    future = loop.create_future()
+    token = next(_tokens)
+
+    def on_result(result):
+        loop.call_soon_threadsafe(lambda: future.done() or future.set_result(result))
+
+    def on_error(error):
+        loop.call_soon_threadsafe(lambda: future.done() or future.set_exception(error))
+
+    get_pool().apply_async(_call, (token, func, args), callback=on_result, error_callback=on_error)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        _kill_job(token)
+        raise TimeoutError(f"Fayl {timeout:.0f} sekundda qayta ishlanmadi")
+    finally:
+        _drain_started()
+        _running.pop(token, None)
+
+
+def shutdown_pool():
+    """Bot to'xtaganda process poolni yopadi"""
+    global _pool, _started
+    if _pool is not None:
+        _pool.terminate()
+        _pool = None
+        _started = None
+        _running.clear()
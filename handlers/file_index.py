@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from config import FILE_INDEX_MAX_ENTRIES
+from database.db import get_session
+from database.models import FileIndex
+from handlers.cache import conversion_cache
+
+# Telegram file_unique_id -> SHA-256 (xotiradagi LRU nusxa, asosiy manba - file_index jadvali)
+_index: OrderedDict = OrderedDict()
+
+
+def _remember_local(file_unique_id: str, digest: str):
+    _index[file_unique_id] = digest
+    _index.move_to_end(file_unique_id)
+    while len(_index) > FILE_INDEX_MAX_ENTRIES:
+        _index.popitem(last=False)
+
+
+async def lookup_file(file_unique_id: str) -> tuple:
+    """
+    Oldin qayta ishlangan fayl bo'lsa (sha256, analysis) qaytaradi, aks holda (None, None).
+    
+    Avval xotiradagi indeks va natija keshi, keyin file_index jadvali tekshiriladi.
+    Topilgan tahlil natija keshiga qayta yuklanadi.
+    """
+    digest = _index.get(file_unique_id)
+    if digest:
+        _index.move_to_end(file_unique_id)
+        analysis = conversion_cache.get_analysis(digest)
+        if analysis is not None:
+            return digest, analysis
+    
+    try:
+        async for session in get_session():
+            stmt = select(FileIndex.sha256, FileIndex.analysis).where(FileIndex.file_unique_id == file_unique_id)
+            row = (await session.execute(stmt)).first()
+    except Exception as e:
+        print(f"file_index o'qishda xatolik: {e}")
+        return None, None
+    
+    if not row or not row.analysis:
+        return None, None
+    
+    _remember_local(file_unique_id, row.sha256)
+    conversion_cache.put_analysis(row.sha256, row.analysis)
+    return row.sha256, row.analysis
+
+
+async def remember_file(file_unique_id: str, digest: str, analysis: dict, file_size: int | None = None):
+    """Yangi faylni indeksga yozadi (xotira + file_index jadvali)"""
+    _remember_local(file_unique_id, digest)
+    
+    try:
+        async for session in get_session():
+            stmt = insert(FileIndex).values(
+                file_unique_id=file_unique_id,
+                sha256=digest,
+                file_size=file_size,
+                analysis=analysis
+            ).on_conflict_do_update(
+                index_elements=[FileIndex.file_unique_id],
+                set_={"sha256": digest, "file_size": file_size, "analysis": analysis}
+            )
+            await session.execute(stmt)
+            await session.commit()
+    except Exception as e:
+        print(f"file_index yozishda xatolik: {e}")
@@ -0,0 +1,211 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, and_, case, update, func
+from sqlalchemy.orm import aliased
+from sqlalchemy.future import select
+
+from config import JOB_MAX_ATTEMPTS, JOB_LOCK_TIMEOUT
+from database.db import get_session
+from database.models import ConversionJob
+from handlers.scheduler import ADMIN, PAID
+
+# Job holatlari
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+async def enqueue_order(files: list, telegram_id: int, chat_id: int, lang: str, formats: list | None = None,
+                        priority: str = PAID) -> str:
+    """
+    To'langan buyurtma fayllarini navbatga qo'shadi (bitta tranzaksiyada).
+
+    files - pending buyurtmadagi fayl dict'lari (path, file_id, digest).
+    priority - ustuvorlik sinfi (admin buyurtmalari - ADMIN), worker shu sinf bilan slot oladi.
+
+    Returns:
+        order_key - buyurtma fayllarini bog'lovchi kalit
+    """
+    order_key = str(uuid.uuid4())
+
+    async for session in get_session():
+        for position, item in enumerate(files):
+            session.add(ConversionJob(
+                order_key=order_key,
+                position=position,
+                telegram_id=telegram_id,
+                chat_id=chat_id,
+                lang=lang,
+                file_path=item["path"],
+                file_id=item.get("file_id"),
+                digest=item.get("digest"),
+                formats=list(formats) if formats else None,
+                priority=priority,
+                status=QUEUED,
+                max_attempts=JOB_MAX_ATTEMPTS,
+            ))
+        await session.commit()
+
+    return order_key
+
+
+async def claim_job(worker_id: str) -> ConversionJob | None:
+    """
+    Navbatdagi bitta jobni oladi (FOR UPDATE SKIP LOCKED).
+
+    Bir nechta worker bir vaqtda chaqirsa ham har bir job faqat bittasiga tushadi.
+    JOB_LOCK_TIMEOUT dan uzoq "running" holatda qolgan job (worker yiqilgan) urinishlari
+    qolgan bo'lsa qayta olinadi, aks holda "failed" deb belgilanadi (workerni yiqitadigan fayl
+    cheksiz qayta olinmasligi uchun).
+
+    Tartib userlar orasida adolatli: avval admin joblari, keyin hozir eng kam "running" jobi bor
+    userning jobi (50 ta faylli buyurtma boshqalarni to'sib qo'ymaydi - bo'shagan har bir slot
+    navbatdagi userga tushadi), bir xil bo'lsa - eng eskisi.
+    SCHEDULER_WEIGHTS (sinflar og'irligi, retry sinfi) bu yerda qo'llanmaydi - ular faqat
+    inline rejimdagi FairScheduler uchun; qayta urinishlar run_after orqali kechiktiriladi.
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=JOB_LOCK_TIMEOUT)
+    stale = and_(ConversionJob.status == RUNNING, ConversionJob.locked_at < stale_before)
+
+    expire = (
+        update(ConversionJob)
+        .where(stale, ConversionJob.attempts >= ConversionJob.max_attempts)
+        .values(
+            status=FAILED,
+            finished_at=now,
+            locked_at=None,
+            last_error="Worker javob bermadi (JOB_LOCK_TIMEOUT)",
+        )
+        .execution_options(synchronize_session=False)
+    )
+    running = aliased(ConversionJob)
+    user_running = (
+        select(func.count())
+        .where(running.telegram_id == ConversionJob.telegram_id, running.status == RUNNING)
+        .correlate(ConversionJob)
+        .scalar_subquery()
+    )
+    candidate = (
+        select(ConversionJob.id)
+        .where(or_(
+            and_(ConversionJob.status == QUEUED, ConversionJob.run_after <= now),
+            and_(stale, ConversionJob.attempts < ConversionJob.max_attempts),
+        ))
+        .order_by(
+            case((ConversionJob.priority == ADMIN, 0), else_=1),
+            user_running,
+            ConversionJob.run_after,
+            ConversionJob.id,
+        )
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(ConversionJob)
+        .where(ConversionJob.id == candidate)
+        .values(
+            status=RUNNING,
+            locked_at=now,
+            worker_id=worker_id,
+            attempts=ConversionJob.attempts + 1,
+        )
+        .returning(ConversionJob)
+        .execution_options(synchronize_session=False)
+    )
+
+    async for session in get_session():
+        expired = (await session.execute(expire)).rowcount
+        if expired:
+            print(f"⚠️ Urinishlari tugagan {expired} ta osilib qolgan job 'failed' deb belgilandi")
+        job = (await session.execute(stmt)).scalar_one_or_none()
+        await session.commit()
+        return job
+
+
+async def _lock_order(session, job_id: int) -> tuple:
+    """
+    Job va uning buyurtmasidagi barcha qatorlarni qulflaydi.
+
+    Bir vaqtda tugagan ikki worker buyurtmaning "oxirgi" faylini ikki marta ko'rmasligi uchun.
+    """
+    order_key = select(ConversionJob.order_key).where(ConversionJob.id == job_id).scalar_subquery()
+    stmt = select(ConversionJob).where(ConversionJob.order_key == order_key).with_for_update()
+    order_jobs = (await session.execute(stmt)).scalars().all()
+    job = next((j for j in order_jobs if j.id == job_id), None)
+    return job, order_jobs
+
+
+def _order_finished(job_id: int, order_jobs: list) -> bool:
+    return not any(j.id != job_id and j.status in (QUEUED, RUNNING) for j in order_jobs)
+
+
+async def complete_job(job_id: int) -> bool:
+    """
+    Jobni bajarilgan deb belgilaydi.
+
+    Returns:
+        True - buyurtmaning barcha fayllari tugadi (userga "tayyor" yuborish mumkin)
+    """
+    async for session in get_session():
+        job, order_jobs = await _lock_order(session, job_id)
+        if not job:
+            return False
+
+        job.status = DONE
+        job.finished_at = datetime.utcnow()
+        job.last_error = None
+
+        finished = _order_finished(job_id, order_jobs)
+        await session.commit()
+        return finished
+
+
+async def fail_job(job_id: int, error: str) -> tuple:
+    """
+    Xatoni yozadi va jobni qayta navbatga qo'yadi (eksponensial kutish bilan).
+
+    Returns:
+        (failed, order_finished) - failed=True bo'lsa urinishlar tugagan, job butunlay "failed"
+    """
+    async for session in get_session():
+        job, order_jobs = await _lock_order(session, job_id)
+        if not job:
+            return True, False
+
+        job.last_error = error[:1000]
+        job.locked_at = None
+
+        if job.attempts >= job.max_attempts:
+            job.status = FAILED
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = QUEUED
+            job.run_after = datetime.utcnow() + timedelta(seconds=10 * 2 ** (job.attempts - 1))
+
+        failed = job.status == FAILED
+        finished = failed and _order_finished(job_id, order_jobs)
+        await session.commit()
+        return failed, finished
+
+
+async def get_queue_stats() -> dict:
+    """
+    Navbat holati: holatlar bo'yicha joblar soni va eng eski kutayotgan jobning kutish vaqti.
+
+    Returns:
+        {"counts": {holat: soni}, "oldest_wait": sekund}
+    """
+    async for session in get_session():
+        stmt = select(ConversionJob.status, func.count()).group_by(ConversionJob.status)
+        rows = (await session.execute(stmt)).all()
+        oldest = (await session.execute(
+            select(func.min(ConversionJob.created_at)).where(ConversionJob.status == QUEUED)
+        )).scalar()
+        return {
+            "counts": {status: count for status, count in rows},
+            "oldest_wait": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+        }
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+from sqlalchemy import String, insert, literal, update
+from sqlalchemy.future import select
+
+from database.models import BalanceLedger, User
+from handlers.profiles import user_profiles
+
+# balance_ledger.reason qiymatlari
+PAYMENT = "payment"                  # To'liq balansdan to'lov
+PARTIAL_PAYMENT = "partial_payment"  # Click + balans (balans qismi)
+PROMO = "promo"                      # Promokod mukofoti
+REFERRAL = "referral"                # Referal mukofoti
+
+
+async def _apply(session, telegram_id: int, amount: float, reason: str, reference, condition=None, **values):
+    """
+    Balansni bitta SQL so'rovda o'zgartiradi va ledgerga yozadi:
+
+        WITH changed AS (UPDATE users SET balance = balance + :amount ... RETURNING ...),
+             ledger AS (INSERT INTO balance_ledger ... SELECT ... FROM changed)
+        SELECT balance, total_earned, referral_count FROM changed
+
+    Qator o'zgarmasa (user yo'q yoki shart bajarilmadi) ledgerga ham hech narsa yozilmaydi.
+    Commit chaqiruvchida - boshqa yozuvlar (promokod, referal tarixi) bilan bitta tranzaksiyada.
+
+    Returns:
+        (balance, total_earned, referral_count) qatori yoki None
+    """
+    stmt = update(User).where(User.telegram_id == telegram_id)
+    if condition is not None:
+        stmt = stmt.where(condition)
+    changed = (
+        stmt.values(balance=User.balance + amount, **values)
+        .returning(User.telegram_id, User.balance, User.total_earned, User.referral_count)
+        .cte("changed")
+    )
+    ledger = insert(BalanceLedger).from_select(
+        ["telegram_id", "amount", "balance_after", "reason", "reference", "created_at"],
+        select(
+            changed.c.telegram_id,
+            literal(float(amount)),
+            changed.c.balance,
+            literal(reason),
+            literal(str(reference) if reference is not None else None, String),
+            literal(datetime.utcnow()),
+        ),
+    ).cte("ledger")
+    query = select(changed.c.balance, changed.c.total_earned, changed.c.referral_count).add_cte(ledger)
+
+    return (await session.execute(query)).one_or_none()
+
+
+async def debit(session, telegram_id: int, amount: float, reason: str, reference=None):
+    """
+    Balansdan yechadi - faqat mablag' yetarli bo'lsa (WHERE balance >= :amount).
+
+    Tekshirish va yechish bitta UPDATE da, shuning uchun ikki marta bosish yoki parallel
+    to'lovlar balansni manfiyga tushira olmaydi va bir-birining o'zgarishini yo'qotmaydi.
+
+    Returns:
+        Yangi qator yoki None (mablag' yetarli emas / user yo'q)
+    """
+    return await _apply(session, telegram_id, -amount, reason, reference, condition=User.balance >= amount)
+
+
+async def credit(session, telegram_id: int, amount: float, reason: str, reference=None,
+                 earned: bool = False, referral: bool = False):
+    """
+    Balansga qo'shadi.
+
+    earned=True - total_earned ham oshiriladi, referral=True - referral_count ham +1
+    (referal mukofoti uchun hammasi bitta UPDATE da).
+
+    Returns:
+        Yangi qator yoki None (user yo'q)
+    """
+    values = {}
+    if earned:
+        values["total_earned"] = User.total_earned + amount
+    if referral:
+        values["referral_count"] = User.referral_count + 1
+    return await _apply(session, telegram_id, amount, reason, reference, **values)
+
+
+def remember(telegram_id: int, row):
+    """Commit dan keyin yangi qiymatlarni profil keshiga yozadi (write-through)"""
+    if row is not None:
+        user_profiles.update_balance(telegram_id, row.balance, row.total_earned, row.referral_count)
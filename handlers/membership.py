@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+from aiogram import Router
+from aiogram.types import ChatMemberUpdated
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+
+from config import CHANNEL_USERNAME
+from database.db import get_session
+from database.models import ChannelMember
+
+router = Router()
+
+# Obuna hisoblanadigan statuslar (left, kicked, restricted - obuna emas)
+MEMBER_STATUSES = ("creator", "administrator", "member")
+
+
+class MembershipIndex:
+    """
+    Kanal a'zolari indeksi: user_id -> obuna bo'lganmi.
+
+    Asosiy manba - chat_member updatelari (bot kanalda admin bo'lishi kerak) va channel_members jadvali.
+    Ishga tushganda jadval xotiraga yuklanadi, shundan keyin tekshiruv tarmoqsiz, O(1).
+    Indeksda yo'q userlar uchungina get_chat_member chaqiriladi (natija indeksga yoziladi).
+    """
+
+    def __init__(self):
+        self._members: dict = {}
+        self.updates = 0
+        self.reconciled = 0
+
+    async def load(self):
+        async for session in get_session():
+            rows = (await session.execute(select(ChannelMember.telegram_id, ChannelMember.is_member))).all()
+        self._members = {telegram_id: is_member for telegram_id, is_member in rows}
+        print(f"📢 Kanal a'zolari indeksi yuklandi: {len(self._members)} ta user")
+
+    def get(self, user_id: int) -> bool | None:
+        return self._members.get(user_id)
+
+    async def record(self, user_id: int, status: str):
+        """Holatni xotira va jadvalga yozadi (checked_at har doim yangilanadi)"""
+        status = getattr(status, "value", status)  # aiogram ChatMemberStatus enum -> str
+        is_member = status in MEMBER_STATUSES
+        self._members[user_id] = is_member
+
+        try:
+            async for session in get_session():
+                now = datetime.utcnow()
+                stmt = insert(ChannelMember).values(
+                    telegram_id=user_id,
+                    is_member=is_member,
+                    status=status,
+                    checked_at=now
+                ).on_conflict_do_update(
+                    index_elements=[ChannelMember.telegram_id],
+                    set_={"is_member": is_member, "status": status, "checked_at": now}
+                )
+                await session.execute(stmt)
+                await session.commit()
+        except Exception as e:
+            print(f"channel_members yozishda xatolik: {e}")
+
+    async def stale_users(self, older_than: float, limit: int) -> list:
+        """Eng uzoq tekshirilmagan userlar (davriy solishtirish uchun)"""
+        stale_before = datetime.utcnow() - timedelta(seconds=older_than)
+        async for session in get_session():
+            stmt = (
+                select(ChannelMember.telegram_id)
+                .where(ChannelMember.checked_at < stale_before)
+                .order_by(ChannelMember.checked_at)
+                .limit(limit)
+            )
+            return list((await session.execute(stmt)).scalars().all())
+
+    def stats(self) -> dict:
+        members = sum(1 for is_member in self._members.values() if is_member)
+        return {
+            "known": len(self._members),
+            "members": members,
+            "updates": self.updates,
+            "reconciled": self.reconciled,
+        }
+
+
+membership_index = MembershipIndex()
+
+
+def is_channel(chat) -> bool:
+    return bool(CHANNEL_USERNAME) and (chat.username or "").lower() == CHANNEL_USERNAME.lstrip("@").lower()
+
+
+@router.chat_member()
+async def channel_member_updated(event: ChatMemberUpdated):
+    """Kanalga qo'shilish / chiqish - indeksni darhol yangilaydi"""
+    if not is_channel(event.chat):
+        return
+
+    membership_index.updates += 1
+    await membership_index.record(event.new_chat_member.user.id, event.new_chat_member.status)
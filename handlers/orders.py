@@ -0,0 +1,56 @@
+class PendingOrders:
+    """
+    To'lovni kutayotgan buyurtmalar: kalit (user_id + media_group/xabar) -> buyurtma ma'lumotlari.
+
+    invoice_id bo'yicha ikkinchi indeks ham yuritiladi - to'lov callback'lari va pre_checkout
+    buyurtmani butun lug'atni aylanib chiqmasdan O(1) da topadi.
+    Ikkala indeks faqat shu klass metodlari orqali o'zgaradi (remove() ikkalasidan ham o'chiradi).
+    """
+
+    def __init__(self):
+        self._orders: dict = {}      # kalit -> buyurtma
+        self._by_invoice: dict = {}  # invoice_id -> kalit
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._orders
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def get(self, key: str) -> dict | None:
+        return self._orders.get(key)
+
+    def add(self, key: str, order: dict) -> dict:
+        self._orders[key] = order
+        return order
+
+    def set_invoice(self, key: str, invoice_id: str):
+        """Buyurtmaga invoice_id biriktiradi (oldingisi bo'lsa - indeksdan o'chadi)"""
+        order = self._orders[key]
+        old_invoice = order.get("invoice_id")
+        if old_invoice is not None:
+            self._by_invoice.pop(old_invoice, None)
+        order["invoice_id"] = invoice_id
+        self._by_invoice[invoice_id] = key
+
+    def by_invoice(self, invoice_id: str | None) -> tuple:
+        """
+        Returns:
+            (kalit, buyurtma) yoki (None, None)
+        """
+        key = self._by_invoice.get(invoice_id)
+        if key is None:
+            return None, None
+        return key, self._orders[key]
+
+    def remove(self, key: str) -> dict | None:
+        order = self._orders.pop(key, None)
+        if order is not None and order.get("invoice_id") is not None:
+            self._by_invoice.pop(order["invoice_id"], None)
+        return order
+
+    def stats(self) -> dict:
+        return {"orders": len(self._orders), "invoices": len(self._by_invoice)}
+
+
+pending_orders = PendingOrders()
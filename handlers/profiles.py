@@ -0,0 +1,104 @@
+import time
+from collections import OrderedDict
+
+from sqlalchemy.future import select
+
+from config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL
+from database.models import User
+
+
+class UserProfile:
+    """User qatorining handlerlar ko'p o'qiydigan maydonlari (nusxa)"""
+    __slots__ = ("telegram_id", "language", "balance", "total_earned", "referral_code", "referral_count",
+                 "first_name", "username")
+
+    def __init__(self, user: User):
+        self.telegram_id = user.telegram_id
+        self.language = user.language
+        self.balance = user.balance or 0.0
+        self.total_earned = user.total_earned or 0.0
+        self.referral_code = user.referral_code
+        self.referral_count = user.referral_count or 0
+        self.first_name = user.first_name
+        self.username = user.username
+
+
+class ProfileCache:
+    """
+    telegram_id -> UserProfile LRU keshi (TTL bilan).
+
+    Write-through: User o'zgartirilib commit qilingandan keyin put(user) chaqiriladi
+    (til), balans o'zgarganda - update_balance() (handlers.ledger). Boshqa instance'lar o'zgarishini TTL
+    tugagach ko'radi.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()  # telegram_id -> (profile, expires_at)
+
+    def get(self, telegram_id: int) -> UserProfile | None:
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[telegram_id]
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(telegram_id)
+        return entry[0]
+
+    def put(self, user: User | None) -> UserProfile | None:
+        if user is None or user.telegram_id is None:
+            return None
+        profile = UserProfile(user)
+        self._entries[user.telegram_id] = (profile, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user.telegram_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return profile
+
+    def update_balance(self, telegram_id: int, balance: float, total_earned: float | None = None,
+                       referral_count: int | None = None):
+        """Keshdagi profilning balans maydonlarini yangilaydi (profil keshda bo'lmasa - hech narsa)"""
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            return
+        profile = entry[0]
+        profile.balance = balance or 0.0
+        if total_earned is not None:
+            profile.total_earned = total_earned
+        if referral_count is not None:
+            profile.referral_count = referral_count
+
+    def invalidate(self, telegram_id: int):
+        self._entries.pop(telegram_id, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+user_profiles = ProfileCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+
+
+def user_language(profile: UserProfile | User | None) -> str:
+    """Profil (yoki User) dan til (ro'yxatdan o'tmagan bo'lsa - uz)"""
+    return (profile.language if profile else None) or "uz"
+
+
+async def load_profile(session, telegram_id: int) -> UserProfile | None:
+    """Keshdan, bo'lmasa DB dan (va keshga yozib) profilni oladi"""
+    profile = user_profiles.get(telegram_id)
+    if profile is None:
+        user = (await session.execute(select(User).where(User.telegram_id == telegram_id))).scalar_one_or_none()
+        profile = user_profiles.put(user)
+    return profile
@@ -5,9 +5,15 @@ from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.future import select
 from database.db import get_session
-from database.models import Promocode, PromocodeUsage, User
+from database.models import Promocode, PromocodeUsage
+from handlers import ledger
+from handlers.profiles import UserProfile, user_language
+from handlers.screens import screens, BACK
 from utils import get_text
 from config import ADMIN_ID
 
@@ -29,16 +35,12 @@ def generate_promo_code(length=8):
 
 # --- User promokod kiritish ---
 @router.callback_query(F.data == "enter_promo")
-async def ask_promo_code(callback: types.CallbackQuery, state: FSMContext):
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+async def ask_promo_code(callback: types.CallbackQuery, state: FSMContext, profile: UserProfile | None):
+    lang = user_language(profile)
     
     await state.set_state(PromoStates.entering_promo)
     
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🏠 " + get_text(lang, "back_to_menu"), callback_data="back_to_menu")]
-    ])
+    _, kb = screens.get(lang, BACK)
     
     try:
         await callback.message.edit_text(get_text(lang, "promo_enter"), reply_markup=kb, parse_mode="HTML")
@@ -49,74 +51,97 @@ async def ask_promo_code(callback: types.CallbackQuery, state: FSMContext):
 
 
 @router.message(PromoStates.entering_promo)
-async def process_promo_code(message: types.Message, state: FSMContext):
-    async for session in get_session():
-        stmt = select(User).where(User.telegram_id == message.from_user.id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-        lang = user.language if user else "uz"
-        
-        promo_code = message.text.strip().upper()
-        
-        # Promokodni topish
-        promo_stmt = select(Promocode).where(
-            Promocode.code == promo_code,
-            Promocode.is_active == True
-        )
-        promo_result = await session.execute(promo_stmt)
-        promo = promo_result.scalar_one_or_none()
-        
-        if not promo:
-            await message.answer(get_text(lang, "promo_invalid"))
-            return
-        
-        # Foydalanuvchi allaqachon ishlatganmi tekshirish
-        usage_stmt = select(PromocodeUsage).where(
-            PromocodeUsage.promocode_id == promo.id,
-            PromocodeUsage.user_id == message.from_user.id
-        )
-        usage_result = await session.execute(usage_stmt)
-        usage = usage_result.scalar_one_or_none()
-        
-        if usage:
-            await message.answer(get_text(lang, "promo_used"))
-            return
-        
-        # Limit tekshirish
-        if promo.max_uses > 0 and promo.current_uses >= promo.max_uses:
-            await message.answer(get_text(lang, "promo_limit"))
-            return
-        
-        # Promokodni qo'llash
-        user.balance += promo.reward_amount
-        promo.current_uses += 1
-        
-        # Foydalanish tarixini saqlash
-        usage = PromocodeUsage(
-            promocode_id=promo.id,
-            user_id=message.from_user.id,
-            reward_amount=promo.reward_amount
-        )
-        session.add(usage)
-        await session.commit()
-        
-        await message.answer(
-            get_text(lang, "promo_success").format(
-                amount=promo.reward_amount,
-                code=promo_code
-            ),
-            parse_mode="HTML"
+async def process_promo_code(message: types.Message, state: FSMContext, session: AsyncSession,
+                             profile: UserProfile | None):
+    lang = user_language(profile)
+    
+    promo_code = message.text.strip().upper()
+    
+    # Promokodni topish
+    promo_stmt = select(Promocode).where(
+        Promocode.code == promo_code,
+        Promocode.is_active == True
+    )
+    promo_result = await session.execute(promo_stmt)
+    promo = promo_result.scalar_one_or_none()
+    
+    if not promo:
+        await message.answer(get_text(lang, "promo_invalid"))
+        return
+    
+    # Foydalanuvchi allaqachon ishlatganmi tekshirish
+    usage_stmt = select(PromocodeUsage).where(
+        PromocodeUsage.promocode_id == promo.id,
+        PromocodeUsage.user_id == message.from_user.id
+    )
+    usage_result = await session.execute(usage_stmt)
+    usage = usage_result.scalar_one_or_none()
+    
+    if usage:
+        await message.answer(get_text(lang, "promo_used"))
+        return
+    
+    # Limit tekshirish
+    if promo.max_uses > 0 and promo.current_uses >= promo.max_uses:
+        await message.answer(get_text(lang, "promo_limit"))
+        return
+    
+    # Promokodni qo'llash - quyidagilar bitta tranzaksiyada, yuqoridagi tekshiruvlar
+    # parallel so'rovlarda eskirgan bo'lishi mumkin, shuning uchun har biri DB da qayta tekshiriladi.
+    # Balans bitta UPDATE da (+ ledger yozuvi)
+    row = await ledger.credit(session, message.from_user.id, promo.reward_amount, ledger.PROMO, promo_code)
+    if row is None:
+        # Ro'yxatdan o'tmagan foydalanuvchi
+        await session.rollback()
+        await message.answer(get_text(lang, "promo_invalid"))
+        return
+    
+    # Foydalanish tarixini saqlash - (promocode_id, user_id) unique, ikkinchi so'rov hech narsa yozmaydi
+    usage_id = (await session.execute(
+        insert(PromocodeUsage)
+        .values(promocode_id=promo.id, user_id=message.from_user.id, reward_amount=promo.reward_amount)
+        .on_conflict_do_nothing(index_elements=["promocode_id", "user_id"])
+        .returning(PromocodeUsage.id)
+    )).scalar_one_or_none()
+    if usage_id is None:
+        await session.rollback()
+        await message.answer(get_text(lang, "promo_used"))
+        return
+    
+    # Limit - shartli UPDATE (max_uses dan oshib ketmaydi)
+    uses = (await session.execute(
+        update(Promocode)
+        .where(
+            Promocode.id == promo.id,
+            or_(Promocode.max_uses <= 0, Promocode.current_uses < Promocode.max_uses)
         )
-        
-        await state.clear()
+        .values(current_uses=Promocode.current_uses + 1)
+        .returning(Promocode.current_uses)
+        .execution_options(synchronize_session=False)
+    )).scalar_one_or_none()
+    if uses is None:
+        await session.rollback()
+        await message.answer(get_text(lang, "promo_limit"))
+        return
+    
+    await session.commit()
+    ledger.remember(message.from_user.id, row)
+    
+    await message.answer(
+        get_text(lang, "promo_success").format(
+            amount=promo.reward_amount,
+            code=promo_code
+        ),
+        parse_mode="HTML"
+    )
+    
+    await state.clear()
 
 
 # --- Admin promokod yaratish ---
 @router.callback_query(F.data == "admin_create_promo")
-async def start_create_promo(callback: types.CallbackQuery, state: FSMContext):
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+async def start_create_promo(callback: types.CallbackQuery, state: FSMContext, profile: UserProfile | None):
+    lang = user_language(profile)
     
     await state.set_state(PromoStates.waiting_for_code)
     
@@ -134,15 +159,13 @@ async def start_create_promo(callback: types.CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "promo_auto_code", PromoStates.waiting_for_code)
-async def auto_generate_code(callback: types.CallbackQuery, state: FSMContext):
+async def auto_generate_code(callback: types.CallbackQuery, state: FSMContext, profile: UserProfile | None):
     # Avtomatik kod yaratish
     promo_code = generate_promo_code()
     await state.update_data(code=promo_code)
     await state.set_state(PromoStates.waiting_for_amount)
     
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+    lang = user_language(profile)
     
     await callback.message.answer(
         f"📝 Kod avtomatik yaratildi: <code>{promo_code}</code>\n\n" + get_text(lang, "promo_create_amount"),
@@ -152,7 +175,7 @@ async def auto_generate_code(callback: types.CallbackQuery, state: FSMContext):
 
 
 @router.message(PromoStates.waiting_for_code)
-async def receive_promo_code(message: types.Message, state: FSMContext):
+async def receive_promo_code(message: types.Message, state: FSMContext, profile: UserProfile | None):
     promo_code = message.text.strip().upper()
     
     # Kod allaqachon mavjudligini tekshirish
@@ -165,8 +188,7 @@ async def receive_promo_code(message: types.Message, state: FSMContext):
             await message.answer("❌ Bu kod allaqachon mavjud. Boshqa kod kiriting:")
             return
         
-        lang_stmt = select(User.language).where(User.telegram_id == message.from_user.id)
-        lang = (await session.execute(lang_stmt)).scalar() or "uz"
+        lang = user_language(profile)
     
     await state.update_data(code=promo_code)
     await state.set_state(PromoStates.waiting_for_amount)
@@ -174,7 +196,7 @@ async def receive_promo_code(message: types.Message, state: FSMContext):
 
 
 @router.message(PromoStates.waiting_for_amount)
-async def receive_promo_amount(message: types.Message, state: FSMContext):
+async def receive_promo_amount(message: types.Message, state: FSMContext, profile: UserProfile | None):
     try:
         amount = float(message.text.strip())
         if amount <= 0:
@@ -183,9 +205,7 @@ async def receive_promo_amount(message: types.Message, state: FSMContext):
         await state.update_data(amount=amount)
         await state.set_state(PromoStates.waiting_for_uses)
         
-        async for session in get_session():
-            stmt = select(User.language).where(User.telegram_id == message.from_user.id)
-            lang = (await session.execute(stmt)).scalar() or "uz"
+        lang = user_language(profile)
         
         await message.answer(get_text(lang, "promo_create_uses"))
     except ValueError:
@@ -193,7 +213,7 @@ async def receive_promo_amount(message: types.Message, state: FSMContext):
 
 
 @router.message(PromoStates.waiting_for_uses)
-async def receive_promo_uses(message: types.Message, state: FSMContext):
+async def receive_promo_uses(message: types.Message, state: FSMContext, profile: UserProfile | None):
     try:
         max_uses = int(message.text.strip())
         if max_uses < 0:
@@ -214,8 +234,7 @@ async def receive_promo_uses(message: types.Message, state: FSMContext):
             session.add(promo)
             await session.commit()
             
-            lang_stmt = select(User.language).where(User.telegram_id == message.from_user.id)
-            lang = (await session.execute(lang_stmt)).scalar() or "uz"
+            lang = user_language(profile)
         
         uses_text = f"{max_uses}" if max_uses > 0 else "♾️ Cheksiz"
         
@@ -236,14 +255,13 @@ async def receive_promo_uses(message: types.Message, state: FSMContext):
 
 # --- Admin promokodlar ro'yxati ---
 @router.callback_query(F.data == "admin_promo_list")
-async def show_promo_list(callback: types.CallbackQuery):
+async def show_promo_list(callback: types.CallbackQuery, profile: UserProfile | None):
     async for session in get_session():
         stmt = select(Promocode).order_by(Promocode.created_at.desc()).limit(10)
         result = await session.execute(stmt)
         promos = result.scalars().all()
         
-        lang_stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(lang_stmt)).scalar() or "uz"
+        lang = user_language(profile)
         
         if not promos:
             await callback.message.edit_text(get_text(lang, "promo_list_empty"))
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from config import CONVERT_GLOBAL_CONCURRENCY, SCHEDULER_WEIGHTS
+
+# Ustuvorlik sinflari
+ADMIN = "admin"
+PAID = "paid"
+RETRY = "retry"
+
+# Kutish vaqti statistikasi uchun oxirgi o'lchovlar soni
+WAIT_SAMPLES = 1000
+
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class FairScheduler:
+    """
+    Konvertatsiya slotlarini taqsimlovchi adolatli navbat.
+
+    - Ustuvorlik sinflari (admin, paid, retry) orasida - weighted round-robin (smooth WRR)
+    - Bitta sinf ichida - userlar bo'yicha round-robin, har bir userning so'rovlari FIFO
+
+    Sinf og'irliklari bitta process ichida ishlaydi (inline rejim, CONVERT_QUEUE=0). Navbat
+    rejimida workerlar orasidagi tartibni handlers.jobs.claim_job belgilaydi.
+
+    Shuning uchun 50 ta fayl yuborgan user boshqalarni to'sib qo'ymaydi: har bir bo'shagan
+    slot navbatdagi userga beriladi.
+    """
+
+    def __init__(self, capacity: int, weights: dict):
+        self.capacity = max(1, capacity)
+        self.weights = {ADMIN: 1, PAID: 1, RETRY: 1, **weights}
+        self.active = 0
+        self.granted = 0
+        # sinf -> OrderedDict(user_id -> deque[(future, navbatga qo'yilgan vaqt)])
+        self._queues = {cls: OrderedDict() for cls in self.weights}
+        self._current = {cls: 0 for cls in self.weights}
+        self._waits = {cls: deque(maxlen=WAIT_SAMPLES) for cls in self.weights}
+
+    def _waiting(self) -> int:
+        return sum(len(q) for users in self._queues.values() for q in users.values())
+
+    def _next_class(self) -> str | None:
+        """Bo'sh bo'lmagan sinflar orasidan smooth weighted round-robin bo'yicha tanlaydi"""
+        candidates = [cls for cls, users in self._queues.items() if users]
+        if not candidates:
+            return None
+
+        total = 0
+        for cls in candidates:
+            self._current[cls] += self.weights[cls]
+            total += self.weights[cls]
+        chosen = max(candidates, key=lambda cls: self._current[cls])
+        self._current[chosen] -= total
+        return chosen
+
+    def _pop(self, cls: str) -> tuple:
+        """Sinf ichida navbatdagi userning eng eski so'rovini oladi (userlar aylanma tartibda)"""
+        users = self._queues[cls]
+        user_id, queue = next(iter(users.items()))
+        entry = queue.popleft()
+        if queue:
+            users.move_to_end(user_id)
+        else:
+            del users[user_id]
+        return entry
+
+    def _dispatch(self):
+        while self.active < self.capacity:
+            cls = self._next_class()
+            if cls is None:
+                return
+            future, enqueued_at = self._pop(cls)
+            if future.done():
+                continue  # Kutayotgan task bekor qilingan
+
+            self.active += 1
+            self.granted += 1
+            self._waits[cls].append(time.monotonic() - enqueued_at)
+            future.set_result(None)
+
+    async def acquire(self, user_id: int, priority: str = PAID):
+        if priority not in self._queues:
+            priority = PAID
+
+        if self.active < self.capacity and not self._waiting():
+            self.active += 1
+            self.granted += 1
+            self._waits[priority].append(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user_id, deque()).append((future, time.monotonic()))
+        # Bo'sh slot bo'lsa (navbatda faqat bekor qilinganlar qolgan) - darhol beriladi
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Slot berilgan, lekin task shu paytda bekor qilingan - slotni qaytarish
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, priority: str = PAID):
+        await self.acquire(user_id, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        classes = {}
+        for cls, users in self._queues.items():
+            waits = list(self._waits[cls])
+            classes[cls] = {
+                "depth": sum(len(q) for q in users.values()),
+                "users": len(users),
+                "wait_p50": _percentile(waits, 0.50),
+                "wait_p95": _percentile(waits, 0.95),
+            }
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "waiting": self._waiting(),
+            "granted": self.granted,
+            "classes": classes,
+        }
+
+
+conversion_scheduler = FairScheduler(CONVERT_GLOBAL_CONCURRENCY, SCHEDULER_WEIGHTS)
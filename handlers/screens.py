@@ -0,0 +1,119 @@
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from config import CHANNEL_USERNAME
+from utils import locales, get_text
+
+# Ekranlar (callback'larda qayta-qayta yig'iladigan statik matn + klaviatura)
+MAIN = "main"            # /start va obuna tekshiruvidan keyingi menyu (promo tugmasi bilan)
+MENU = "menu"            # "Asosiy menyu" tugmasi orqali qaytish (promo tugmasisiz)
+SUBSCRIBE = "subscribe"  # Kanalga obuna talab qilinadi
+OFFER = "offer"          # Ommaviy oferta
+BACK = "back"            # Faqat "Asosiy menyu" tugmasi (profil, referal, promo)
+
+DEFAULT_OFFER_LINK = "https://t.me/oxu_docx"
+
+
+def get_offer_link(lang: str, settings) -> str:
+    if not settings:
+        return DEFAULT_OFFER_LINK
+    return {
+        "uz": settings.uz_offer,
+        "ru": settings.ru_offer,
+        "en": settings.en_offer,
+    }.get(lang, settings.uz_offer)
+
+
+def _menu_text(lang: str) -> str:
+    return f"{get_text(lang, 'start')}\n\n{get_text(lang, 'choose_action')}"
+
+
+def _back_button(lang: str) -> list:
+    return [InlineKeyboardButton(text="🏠 " + get_text(lang, "back_to_menu"), callback_data="back_to_menu")]
+
+
+def _build_menu(lang: str, is_admin: bool, with_promo: bool) -> tuple:
+    buttons = [[InlineKeyboardButton(text=get_text(lang, "convert_btn"), callback_data="start_convert")]]
+    if with_promo:
+        buttons.append([InlineKeyboardButton(text=get_text(lang, "promo_btn"), callback_data="enter_promo")])
+    buttons.append([InlineKeyboardButton(text=get_text(lang, "referral_btn"), callback_data="my_referral")])
+    buttons.append([InlineKeyboardButton(text=get_text(lang, "profile_btn"), callback_data="my_profile")])
+
+    # Faqat admin uchun tugma qo'shamiz
+    if is_admin:
+        buttons.append([InlineKeyboardButton(text="⚙️ Admin Panel", callback_data="admin_settings")])
+
+    return _menu_text(lang), InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+class ScreenCache:
+    """
+    Tilga bog'liq statik ekranlar keshi: (til, admin, ekran) -> (matn, klaviatura).
+
+    Klaviaturalar faqat o'qiladi (har bir yuborishda qayta serializatsiya qilinadi),
+    shuning uchun bitta obyektni barcha userlarga berish xavfsiz.
+    Locale qayta yuklansa (locales.version) yoki oferta linklari o'zgarsa kesh tozalanadi.
+    """
+
+    def __init__(self):
+        self._screens: dict = {}
+        self._version = None
+        self.offer_links: dict | None = None  # til -> oferta linki (settings_store yuklaganda o'rnatiladi)
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self):
+        if self._version != locales.version:
+            self._screens.clear()
+            self._version = locales.version
+
+    def _build(self, lang: str, screen: str, is_admin: bool) -> tuple:
+        if screen == MAIN:
+            return _build_menu(lang, is_admin, with_promo=True)
+        if screen == MENU:
+            return _build_menu(lang, is_admin, with_promo=False)
+        if screen == SUBSCRIBE:
+            return get_text(lang, "must_subscribe"), InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text=get_text(lang, "subscribe_btn"), url=f"https://t.me/{CHANNEL_USERNAME}")],
+                [InlineKeyboardButton(text=get_text(lang, "check_subscription"), callback_data="check_sub")]
+            ])
+        if screen == OFFER:
+            offer_url = (self.offer_links or {}).get(lang) or DEFAULT_OFFER_LINK
+            return get_text(lang, "offer_text"), InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text=get_text(lang, "view_offer"), url=offer_url)],
+                [InlineKeyboardButton(text=get_text(lang, "confirm"), callback_data="confirm_offer")],
+                _back_button(lang)
+            ])
+        if screen == BACK:
+            return None, InlineKeyboardMarkup(inline_keyboard=[_back_button(lang)])
+        raise KeyError(screen)
+
+    def get(self, lang: str, screen: str, is_admin: bool = False) -> tuple:
+        """
+        Returns:
+            (matn, klaviatura) - BACK ekranida matn None
+        """
+        self._check_version()
+        key = (lang, is_admin, screen)
+        cached = self._screens.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        cached = self._screens[key] = self._build(lang, screen, is_admin)
+        return cached
+
+    def set_offer_links(self, settings):
+        """Settings dan oferta linklarini yuklaydi (OFFER ekrani shu linklar bilan yig'iladi)"""
+        self.offer_links = {lang: get_offer_link(lang, settings) for lang in ("uz", "ru", "en")}
+        self._drop(OFFER)
+
+    def _drop(self, screen: str):
+        for key in [key for key in self._screens if key[2] == screen]:
+            del self._screens[key]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._screens), "hits": self.hits, "misses": self.misses}
+
+
+screens = ScreenCache()
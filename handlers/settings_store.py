@@ -0,0 +1,117 @@
+import asyncio
+import os
+import socket
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.future import select
+
+from database.db import DATABASE_URL, get_session
+from database.models import Settings
+from handlers.screens import screens
+
+# Sozlamalar o'zgarganini boshqa bot instance'lariga bildiruvchi Postgres kanali
+SETTINGS_CHANNEL = "settings_changed"
+# LISTEN ulanishi uzilganini tekshirish va qayta ulanish oralig'i (sekund)
+LISTEN_PING_INTERVAL = 30
+LISTEN_RETRY_DELAY = 5
+
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SettingsSnapshot:
+    """settings jadvalidagi yagona qatorning o'zgarmas nusxasi (qator bo'lmasa - default qiymatlar)"""
+    __slots__ = ("uz_offer", "ru_offer", "en_offer", "referral_reward")
+
+    def __init__(self, settings: Settings | None = None):
+        self.uz_offer = (settings.uz_offer if settings else None) or ""
+        self.ru_offer = (settings.ru_offer if settings else None) or ""
+        self.en_offer = (settings.en_offer if settings else None) or ""
+        self.referral_reward = settings.referral_reward if settings and settings.referral_reward is not None else 1000.0
+
+
+class SettingsStore:
+    """
+    Sozlamalarning xotiradagi nusxasi: ishga tushganda yuklanadi, o'qish DB ga murojaat qilmaydi.
+
+    Admin o'zgartirganda changed() chaqiriladi - nusxa qayta yuklanadi va pg_notify orqali
+    boshqa instance'lar xabardor qilinadi (ular LISTEN qilib, o'zlarining nusxasini yangilaydi).
+    """
+
+    def __init__(self):
+        self.snapshot = SettingsSnapshot()
+        self.version = 0
+        self.notifications = 0
+
+    def get(self) -> SettingsSnapshot:
+        return self.snapshot
+
+    async def load(self):
+        async for session in get_session():
+            settings = (await session.execute(select(Settings).limit(1))).scalar_one_or_none()
+            self.snapshot = SettingsSnapshot(settings)
+
+        self.version += 1
+        # Oferta ekrani keshi yangi linklar bilan qayta yig'iladi
+        screens.set_offer_links(self.snapshot)
+
+    async def changed(self):
+        """Admin sozlamani commit qilgandan keyin chaqiriladi"""
+        await self.load()
+        try:
+            async for session in get_session():
+                await session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                      {"channel": SETTINGS_CHANNEL, "payload": INSTANCE_ID})
+                await session.commit()
+        except Exception as e:
+            print(f"Sozlamalar o'zgarishini bildirishda xatolik: {e}")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        if payload == INSTANCE_ID:
+            return  # O'zimiz yuborgan xabar - nusxa allaqachon yangilangan
+        self.notifications += 1
+        asyncio.create_task(self._reload_logged())
+
+    async def _reload_logged(self):
+        try:
+            await self.load()
+            print(f"🔄 Sozlamalar boshqa instance o'zgarishi bo'yicha yangilandi (versiya {self.version})")
+        except Exception as e:
+            print(f"Sozlamalarni qayta yuklashda xatolik: {e}")
+
+    async def listen(self):
+        """
+        Alohida asyncpg ulanishida LISTEN qiladi (pooldagi ulanishni band qilmaydi).
+
+        Ulanish uzilsa qayta ulanadi va nusxani qayta yuklaydi (uzilish paytidagi xabarlar yo'qolgan bo'lishi mumkin).
+        """
+        dsn = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+        reconnect = False
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(SETTINGS_CHANNEL, self._on_notify)
+                if reconnect:
+                    await self.load()
+
+                while True:
+                    await asyncio.sleep(LISTEN_PING_INTERVAL)
+                    await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Sozlamalar LISTEN ulanishida xatolik: {e}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            reconnect = True
+            await asyncio.sleep(LISTEN_RETRY_DELAY)
+
+    def stats(self) -> dict:
+        return {"version": self.version, "notifications": self.notifications}
+
+
+settings_store = SettingsStore()
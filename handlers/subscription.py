@@ -0,0 +1,80 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from config import SUBSCRIPTION_TTL, SUBSCRIPTION_NEGATIVE_TTL, SUBSCRIPTION_CACHE_SIZE
+
+
+class SubscriptionCache:
+    """
+    Kanal obunasi holatining TTL keshi: user_id -> (obuna bo'lganmi, amal qilish muddati).
+
+    - Obuna bo'lganlar uzoqroq (positive_ttl), bo'lmaganlar qisqa (negative_ttl) saqlanadi -
+      obuna bo'lgan user "tekshirish" tugmasini bosmasa ham tez orada o'tadi
+    - Bitta user uchun bir vaqtda faqat bitta get_chat_member so'rovi (qolganlar shu natijani kutadi)
+    - API xatosi keshlanmaydi
+    """
+
+    def __init__(self, positive_ttl: float, negative_ttl: float, max_entries: int):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+
+    def get_cached(self, user_id: int) -> bool | None:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        is_member, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return is_member
+
+    def set(self, user_id: int, is_member: bool):
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        self._entries[user_id] = (is_member, time.monotonic() + ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    async def get(self, user_id: int, fetch, force: bool = False) -> bool:
+        """
+        fetch - user_id qabul qiluvchi coroutine funksiya (True/False qaytaradi, xatoda exception).
+        force=True - keshni chetlab o'tib API dan qayta so'raydi ("tekshirish" tugmasi).
+        """
+        if not force:
+            cached = self.get_cached(user_id)
+            if cached is not None:
+                self.hits += 1
+                return cached
+
+        self.misses += 1
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.create_task(fetch(user_id))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+
+        # shield - kutayotganlardan biri bekor qilinsa ham so'rov boshqalar uchun davom etadi
+        is_member = await asyncio.shield(task)
+        self.set(user_id, is_member)
+        return is_member
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+subscription_cache = SubscriptionCache(SUBSCRIPTION_TTL, SUBSCRIPTION_NEGATIVE_TTL, SUBSCRIPTION_CACHE_SIZE)
@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+from xml.sax.saxutils import escape
+
+
+class QuestionWriter(ABC):
+    """
+    Savol-javob oqimini bitta chiqish formatiga yozuvchi asosiy klass.
+
+    Writer savollarni xotirada yig'maydi: begin() -> write() (har bir savol uchun) -> end().
+    Birinchi javob - to'g'ri javob, qolganlari - noto'g'ri javoblar (bo'shlari tashlab ketiladi).
+    """
+    extension = "txt"
+
+    def __init__(self, file):
+        self.file = file
+        self.count = 0
+
+    def begin(self):
+        pass
+
+    def write(self, question: str, answers: list):
+        self.count += 1
+        correct = answers[0] if answers else ""
+        wrong = [ans for ans in answers[1:] if ans]
+        self.write_question(question, correct, wrong)
+
+    @abstractmethod
+    def write_question(self, question: str, correct: str, wrong: list):
+        """Bitta savolni formatga yozadi (har bir writer o'zi amalga oshiradi)"""
+
+    def end(self):
+        pass
+
+
+class TxtWriter(QuestionWriter):
+    """? savol / + to'g'ri / - noto'g'ri (asosiy format)"""
+    extension = "txt"
+
+    def write_question(self, question, correct, wrong):
+        self.file.write(f"? {question}\n")
+        if correct:
+            self.file.write(f"+ {correct}\n")
+        for ans in wrong:
+            self.file.write(f"- {ans}\n")
+        self.file.write("\n")
+
+
+class JsonlWriter(QuestionWriter):
+    """Har bir qatorda bitta JSON obyekt"""
+    extension = "jsonl"
+
+    def write_question(self, question, correct, wrong):
+        record = {"question": question, "correct": correct, "wrong": wrong}
+        self.file.write(json.dumps(record, ensure_ascii=False))
+        self.file.write("\n")
+
+
+class CsvWriter(QuestionWriter):
+    """question, correct, wrong, wrong, ... (noto'g'ri javoblar soni qatorga qarab o'zgaradi)"""
+    extension = "csv"
+
+    def begin(self):
+        # Excel UTF-8 ni to'g'ri ochishi uchun BOM
+        self.file.write("\ufeff")
+        self._csv = csv.writer(self.file)
+        self._csv.writerow(["question", "correct", "wrong"])
+
+    def write_question(self, question, correct, wrong):
+        self._csv.writerow([question, correct, *wrong])
+
+
+class MoodleXmlWriter(QuestionWriter):
+    """Moodle XML (multichoice, bitta to'g'ri javob)"""
+    extension = "xml"
+
+    def begin(self):
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n<quiz>\n')
+
+    def write_question(self, question, correct, wrong):
+        self.file.write(
+            '  <question type="multichoice">\n'
+            f'    <name><text>{self.count}</text></name>\n'
+            f'    <questiontext format="plain_text"><text>{escape(question)}</text></questiontext>\n'
+            '    <single>true</single>\n'
+            '    <shuffleanswers>1</shuffleanswers>\n'
+        )
+        if correct:
+            self.file.write(f'    <answer fraction="100" format="plain_text"><text>{escape(correct)}</text></answer>\n')
+        for ans in wrong:
+            self.file.write(f'    <answer fraction="0" format="plain_text"><text>{escape(ans)}</text></answer>\n')
+        self.file.write('  </question>\n')
+
+    def end(self):
+        self.file.write('</quiz>\n')
+
+
+def _gift_escape(text: str) -> str:
+    for char in "\\~=#{}:":
+        text = text.replace(char, "\\" + char)
+    return text.replace("\n", "\\n")
+
+
+class GiftWriter(QuestionWriter):
+    """GIFT (Moodle matn formati)"""
+    extension = "gift"
+
+    def write_question(self, question, correct, wrong):
+        self.file.write(f"::Q{self.count}:: {_gift_escape(question)} {{\n")
+        if correct:
+            self.file.write(f"  ={_gift_escape(correct)}\n")
+        for ans in wrong:
+            self.file.write(f"  ~{_gift_escape(ans)}\n")
+        self.file.write("}\n\n")
+
+
+# Format kodi -> writer klassi (tartib - foydalanuvchiga ko'rsatish tartibi)
+WRITERS = {
+    "txt": TxtWriter,
+    "jsonl": JsonlWriter,
+    "csv": CsvWriter,
+    "moodle": MoodleXmlWriter,
+    "gift": GiftWriter,
+}
+
+FORMAT_LABELS = {
+    "txt": "TXT",
+    "jsonl": "JSONL",
+    "csv": "CSV",
+    "moodle": "Moodle XML",
+    "gift": "GIFT",
+}
+
+DEFAULT_FORMATS = ("txt",)
+
+
+def normalize_formats(formats) -> list:
+    """Noma'lum formatlarni tashlab, WRITERS tartibida qaytaradi (bo'sh bo'lsa - TXT)"""
+    selected = [fmt for fmt in WRITERS if fmt in set(formats or ())]
+    return selected or list(DEFAULT_FORMATS)
+
+
+def render_formats(questions, formats) -> dict:
+    """
+    Savol-javob oqimini bir o'tishda barcha tanlangan formatlarga yozadi.
+
+    questions - [(savol, [javoblar]), ...] ro'yxati yoki generator (bir marta aylaniladi).
+
+    Returns:
+        {format: bytes}
+    """
+    buffers = {}
+    writers = []
+    for fmt in normalize_formats(formats):
+        buffers[fmt] = io.StringIO(newline="")
+        writer = WRITERS[fmt](buffers[fmt])
+        writer.begin()
+        writers.append(writer)
+
+    for question, answers in questions:
+        for writer in writers:
+            writer.write(question, answers)
+
+    for writer in writers:
+        writer.end()
+
+    return {fmt: buffer.getvalue().encode("utf-8") for fmt, buffer in buffers.items()}
@@ -2,49 +2,132 @@
 import os
 from datetime import datetime
 from aiogram import Bot, Dispatcher, F, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, LabeledPrice
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from config import BOT_TOKEN, PROVIDER_TOKEN, FILE_PRICE, ADMIN_ID, CHANNEL_USERNAME
+from config import BOT_TOKEN, PROVIDER_TOKEN, FILE_PRICE, ADMIN_ID, CHANNEL_USERNAME, IN_MEMORY_MAX_MB, DOCX_MAX_FILE_MB
+from config import CONVERT_ORDER_CONCURRENCY, CONVERT_QUEUE
+from config import MEMBERSHIP_RECONCILE_INTERVAL, MEMBERSHIP_RECONCILE_BATCH, MEMBERSHIP_STALE_AFTER
 from database.db import get_session, engine
-from database.models import Base, User, Settings, Payment, ReferralHistory
-from handlers.convert import convert_docx_to_txt, analyze_docx_file
+from database.models import Base, User, Payment, ReferralHistory
+from handlers.convert import convert_docx_to_txt, convert_docx_to_formats, parse_docx_file
+from handlers.executor import run_in_pool, shutdown_pool
+from handlers.cache import conversion_cache
+from handlers.file_index import lookup_file, remember_file
+from handlers.jobs import enqueue_order
+from handlers.orders import pending_orders
+from handlers import ledger
+from handlers.scheduler import conversion_scheduler, ADMIN, PAID
+from handlers.writers import WRITERS, FORMAT_LABELS, DEFAULT_FORMATS, normalize_formats
 from handlers.admin import router as admin_router
 from handlers.promocode import router as promo_router
 from handlers.referral import generate_referral_code, extract_referral_code
-from utils import ensure_dir, validate_docx, get_text
+from handlers.screens import screens, MAIN, MENU, SUBSCRIBE, OFFER, BACK
+from handlers.settings_store import settings_store
+from handlers.subscription import subscription_cache
+from handlers.profiles import UserProfile, user_profiles, load_profile, user_language
+from handlers.membership import router as membership_router, membership_index, MEMBER_STATUSES
+from middlewares.throttling import ThrottlingMiddleware
+from middlewares.database import DatabaseMiddleware
+from utils import ensure_dir, validate_docx, docx_size_allowed, inspect_docx, get_text, file_sha256, bytes_sha256, result_caption
 
 bot = Bot(BOT_TOKEN)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
+# So'rovlar chegarasi - limitdan oshgan update hech qaysi handlerga yetib bormaydi
+dp.message.outer_middleware(ThrottlingMiddleware())
+dp.callback_query.outer_middleware(ThrottlingMiddleware())
+# Handler topilgandan keyin: bitta session + user profili (session, profile, db_user argumentlari)
+dp.message.middleware(DatabaseMiddleware())
+dp.callback_query.middleware(DatabaseMiddleware())
 dp.include_router(admin_router)
 dp.include_router(promo_router)
+dp.include_router(membership_router)
 
 ensure_dir("files")
 
 # Bot ma'lumotlari (username uchun)
 BOT_INFO = None
 
-# Gruh fayllarni vaqtincha saqlash
-pending_group_files = {}
+# Gruh fayllar (to'lov kutayotgan buyurtmalar) - handlers.orders.pending_orders
 # Gruh timeout tasklar
 group_timeout_tasks = {}
 # To'lov timeout tasklar (30 daqiqa)
 payment_timeout_tasks = {}
 
 
+def drop_pending_order(key: str):
+    """Buyurtmani (ikkala indeksdan) va uning timeout tasklarini o'chiradi"""
+    pending_orders.remove(key)
+    current = asyncio.current_task()
+    for tasks in (group_timeout_tasks, payment_timeout_tasks):
+        task = tasks.pop(key, None)
+        # Joriy task (masalan, to'lov timeout'ining o'zi) bekor qilinmaydi
+        if task is not None and task is not current:
+            task.cancel()
+
+
+def keep_in_memory(file_size: int | None) -> bool:
+    """Fayl diskka yozilmasdan xotirada qayta ishlanishi mumkinmi"""
+    # Navbat rejimida fayl alohida worker processga umumiy papka orqali uzatiladi
+    if CONVERT_QUEUE:
+        return False
+    return IN_MEMORY_MAX_MB > 0 and file_size is not None and file_size <= IN_MEMORY_MAX_MB * 1024 * 1024
+
+
+def remove_order_files(files: list):
+    """Buyurtma fayllarini diskdan o'chiradi va bo'sh qolgan user papkasini o'chiradi"""
+    folders = set()
+    for item in files:
+        item["data"] = None  # Xotiradagi baytlarni bo'shatish
+        file_path = item["path"]
+        folders.add(os.path.dirname(file_path))
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except Exception as e:
+            print(f"Fayl o'chirishda xatolik: {e}")
+    
+    for folder in folders:
+        try:
+            if os.path.exists(folder) and not os.listdir(folder):
+                os.rmdir(folder)
+        except Exception as e:
+            print(f"Papka o'chirishda xatolik: {e}")
+
+
 # Kanal obunasini tekshirish funksiyasi
-async def check_subscription(user_id: int) -> bool:
-    """Foydalanuvchi kanalga obuna ekanligini tekshiradi"""
+async def fetch_subscription(user_id: int) -> bool:
+    """get_chat_member orqali so'raydi va natijani kanal a'zolari indeksiga yozadi"""
+    member = await bot.get_chat_member(chat_id=f"@{CHANNEL_USERNAME}", user_id=user_id)
+    await membership_index.record(user_id, member.status)
+    # status: creator, administrator, member - obuna bo'lgan
+    # left, kicked - obuna bo'lmagan
+    return member.status in MEMBER_STATUSES
+
+
+async def check_subscription(user_id: int, force: bool = False) -> bool:
+    """
+    Foydalanuvchi kanalga obuna ekanligini tekshiradi.
+
+    Avval kanal a'zolari indeksi (chat_member updatelari), indeksda yo'q bo'lsa - Telegram API
+    (natija TTL bilan keshlanadi). force=True - indeks va keshni chetlab o'tib API dan qayta so'raydi.
+    
+    Indeksdagi faqat ijobiy javob yakuniy: "a'zo emas" yozuvi eskirgan bo'lishi mumkin (bot kanal
+    admini bo'lmasa chat_member updatelari kelmaydi), shuning uchun u obuna keshiga o'tadi va
+    SUBSCRIPTION_NEGATIVE_TTL tugagach API dan qayta so'raladi.
+    """
     if not CHANNEL_USERNAME:
         return True  # Agar kanal sozlanmagan bo'lsa, barchaga ruxsat
     
+    if not force and membership_index.get(user_id):
+        return True
+    
     try:
-        member = await bot.get_chat_member(chat_id=f"@{CHANNEL_USERNAME}", user_id=user_id)
-        # status: creator, administrator, member - obuna bo'lgan
-        # left, kicked - obuna bo'lmagan
-        return member.status in ["creator", "administrator", "member"]
+        return await subscription_cache.get(user_id, fetch_subscription, force=force)
     except Exception as e:
         print(f"Obuna tekshiruv xatosi: {e}")
         return False
@@ -52,23 +135,46 @@ async def check_subscription(user_id: int) -> bool:
 
 async def send_subscription_required(message: types.Message, lang: str):
     """Kanal obunasi talab qilinganini ko'rsatadi"""
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=get_text(lang, "subscribe_btn"), url=f"https://t.me/{CHANNEL_USERNAME}")],
-        [InlineKeyboardButton(text=get_text(lang, "check_subscription"), callback_data="check_sub")]
-    ])
-    
-    await message.answer(get_text(lang, "must_subscribe"), reply_markup=kb, parse_mode="HTML")
+    text, kb = screens.get(lang, SUBSCRIBE)
+    await message.answer(text, reply_markup=kb, parse_mode="HTML")
+
+
+async def reconcile_membership():
+    """
+    Kanal a'zolari indeksini vaqti-vaqti bilan API bilan solishtiradi.
+
+    Bot kanalda admin bo'lmagan yoki updatelar o'tkazib yuborilgan holatlar uchun:
+    har siklda eng uzoq tasdiqlanmagan MEMBERSHIP_RECONCILE_BATCH ta user qayta so'raladi.
+    """
+    while True:
+        await asyncio.sleep(MEMBERSHIP_RECONCILE_INTERVAL)
+        try:
+            user_ids = await membership_index.stale_users(MEMBERSHIP_STALE_AFTER, MEMBERSHIP_RECONCILE_BATCH)
+        except Exception as e:
+            print(f"A'zolar indeksini o'qishda xatolik: {e}")
+            continue
+        
+        for user_id in user_ids:
+            try:
+                await fetch_subscription(user_id)
+            except TelegramBadRequest:
+                # User topilmadi (akkaunt o'chirilgan va h.k.) - obuna emas
+                await membership_index.record(user_id, "left")
+            except Exception as e:
+                print(f"A'zolikni solishtirishda xatolik: {e}")
+                continue
+            membership_index.reconciled += 1
+            await asyncio.sleep(0.05)  # Telegram API limitlari uchun
 
 
 # Obunani tekshirish callback
 @dp.callback_query(F.data == "check_sub")
-async def check_subscription_callback(callback: types.CallbackQuery):
+async def check_subscription_callback(callback: types.CallbackQuery, profile: UserProfile | None):
     """Obunani tekshirish tugmasi bosilganda"""
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+    lang = user_language(profile)
     
-    if await check_subscription(callback.from_user.id):
+    # User hozirgina obuna bo'lgan bo'lishi mumkin - keshdagi eski javobga ishonmaymiz
+    if await check_subscription(callback.from_user.id, force=True):
         # Obuna bo'lgan - asosiy menyuni yuborish
         await callback.answer("✅")
         await callback.message.delete()
@@ -79,53 +185,50 @@ async def check_subscription_callback(callback: types.CallbackQuery):
 
 
 @dp.message(CommandStart())
-async def start(message: types.Message):
+async def start(message: types.Message, session: AsyncSession, profile: UserProfile | None):
     # Referal kodni ajratib olish
     referral_code = extract_referral_code(message.text)
     
-    async for session in get_session():
-        stmt = select(User).where(User.telegram_id == message.from_user.id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-
-        # Agar foydalanuvchi oldin ro'yxatdan o'tgan bo'lsa
-        if user and user.language:
-            # Kanal obunasini tekshirish
-            if not await check_subscription(message.from_user.id):
-                lang = user.language
-                await send_subscription_required(message, lang)
-                return
-            
+    user = profile
+
+    # Agar foydalanuvchi oldin ro'yxatdan o'tgan bo'lsa
+    if user and user.language:
+        # Kanal obunasini tekshirish
+        if not await check_subscription(message.from_user.id):
             lang = user.language
-            await send_main_menu(message, lang)
+            await send_subscription_required(message, lang)
             return
+        
+        lang = user.language
+        await send_main_menu(message, lang)
+        return
 
-        # Yangi foydalanuvchi - referal kodni tekshirish
-        referred_by_id = None
-        if referral_code:
-            # Referal kod egasini topish
-            ref_stmt = select(User).where(User.referral_code == referral_code)
-            ref_result = await session.execute(ref_stmt)
-            referrer = ref_result.scalar_one_or_none()
-            
-            if referrer and referrer.telegram_id != message.from_user.id:
-                referred_by_id = referrer.telegram_id
-
-        # Agar yangi foydalanuvchi bo'lsa yoki tili yo'q bo'lsa
-        lang_kb = InlineKeyboardMarkup(inline_keyboard=[[
-            InlineKeyboardButton(text="🇺🇿 O'zbek", callback_data=f"lang_uz_{referred_by_id or 0}"),
-            InlineKeyboardButton(text="🇷🇺 Русский", callback_data=f"lang_ru_{referred_by_id or 0}"),
-            InlineKeyboardButton(text="🇬🇧 English", callback_data=f"lang_en_{referred_by_id or 0}")
-        ]])
-        await message.answer(
-            "Tilni tanlang / Выберите язык / Choose language:",
-            reply_markup=lang_kb
-        )
+    # Yangi foydalanuvchi - referal kodni tekshirish
+    referred_by_id = None
+    if referral_code:
+        # Referal kod egasini topish
+        ref_stmt = select(User).where(User.referral_code == referral_code)
+        ref_result = await session.execute(ref_stmt)
+        referrer = ref_result.scalar_one_or_none()
+        
+        if referrer and referrer.telegram_id != message.from_user.id:
+            referred_by_id = referrer.telegram_id
+
+    # Agar yangi foydalanuvchi bo'lsa yoki tili yo'q bo'lsa
+    lang_kb = InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="🇺🇿 O'zbek", callback_data=f"lang_uz_{referred_by_id or 0}"),
+        InlineKeyboardButton(text="🇷🇺 Русский", callback_data=f"lang_ru_{referred_by_id or 0}"),
+        InlineKeyboardButton(text="🇬🇧 English", callback_data=f"lang_en_{referred_by_id or 0}")
+    ]])
+    await message.answer(
+        "Tilni tanlang / Выберите язык / Choose language:",
+        reply_markup=lang_kb
+    )
 
 
 # --- Tilni saqlash ---
 @dp.callback_query(F.data.startswith("lang_"))
-async def set_language(callback: types.CallbackQuery):
+async def set_language(callback: types.CallbackQuery, session: AsyncSession, db_user: User | None):
     parts = callback.data.split("_")
     lang = parts[1]
     referred_by_id = int(parts[2]) if len(parts) > 2 else 0
@@ -136,293 +239,210 @@ async def set_language(callback: types.CallbackQuery):
         await send_subscription_required(callback.message, lang)
         return
 
-    async for session in get_session():
-        stmt = select(User).where(User.telegram_id == callback.from_user.id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
+    user = db_user
 
-        if not user:
-            # Yangi foydalanuvchi - referal kod yaratish
+    if not user:
+        # Yangi foydalanuvchi - referal kod yaratish
+        new_referral_code = generate_referral_code()
+        
+        # Unique ekanligini tekshirish
+        while True:
+            check_stmt = select(User).where(User.referral_code == new_referral_code)
+            check_result = await session.execute(check_stmt)
+            if not check_result.scalar_one_or_none():
+                break
             new_referral_code = generate_referral_code()
+        
+        user = User(
+            telegram_id=callback.from_user.id,
+            username=callback.from_user.username,
+            first_name=callback.from_user.first_name,
+            last_name=callback.from_user.last_name,
+            language=lang,
+            referral_code=new_referral_code,
+            referred_by=referred_by_id if referred_by_id != 0 else None
+        )
+        session.add(user)
+        await session.commit()
+        user_profiles.put(user)
+        
+        # Agar referal orqali kelgan bo'lsa - mukofot berish
+        if referred_by_id and referred_by_id != 0:
+            # Referal mukofot summasi (xotiradagi sozlamalardan)
+            reward = settings_store.get().referral_reward
             
-            # Unique ekanligini tekshirish
-            while True:
-                check_stmt = select(User).where(User.referral_code == new_referral_code)
-                check_result = await session.execute(check_stmt)
-                if not check_result.scalar_one_or_none():
-                    break
-                new_referral_code = generate_referral_code()
-            
-            user = User(
-                telegram_id=callback.from_user.id,
-                username=callback.from_user.username,
-                first_name=callback.from_user.first_name,
-                last_name=callback.from_user.last_name,
-                language=lang,
-                referral_code=new_referral_code,
-                referred_by=referred_by_id if referred_by_id != 0 else None
+            # Referer ga pul qo'shish - balans, total_earned va referral_count bitta UPDATE da (+ ledger yozuvi)
+            referrer = await ledger.credit(
+                session, referred_by_id, reward, ledger.REFERRAL, callback.from_user.id,
+                earned=True, referral=True
             )
-            session.add(user)
-            await session.commit()
             
-            # Agar referal orqali kelgan bo'lsa - mukofot berish
-            if referred_by_id and referred_by_id != 0:
-                # Settings dan referal mukofot summasini olish
-                settings_stmt = select(Settings).limit(1)
-                settings = (await session.execute(settings_stmt)).scalar_one_or_none()
-                reward = settings.referral_reward if settings else 1000.0
-                
-                # Referer ga pul qo'shish
-                referrer_stmt = select(User).where(User.telegram_id == referred_by_id)
-                referrer_result = await session.execute(referrer_stmt)
-                referrer = referrer_result.scalar_one_or_none()
+            if referrer:
+                # ReferralHistory ga yozish
+                ref_history = ReferralHistory(
+                    referrer_id=referred_by_id,
+                    referred_id=callback.from_user.id,
+                    reward_amount=reward
+                )
+                session.add(ref_history)
+                await session.commit()
+                ledger.remember(referred_by_id, referrer)
                 
-                if referrer:
-                    referrer.balance += reward
-                    referrer.total_earned += reward
-                    
-                    # ReferralHistory ga yozish
-                    ref_history = ReferralHistory(
-                        referrer_id=referred_by_id,
-                        referred_id=callback.from_user.id,
-                        reward_amount=reward
+                # Referrer ga xabar yuborish
+                try:
+                    await bot.send_message(
+                        referred_by_id,
+                        f"🎉 Yangi foydalanuvchi sizning havolangiz orqali qo'shildi!\n"
+                        f"💰 Balansingizga +{reward:,.0f} UZS qo'shildi"
                     )
-                    session.add(ref_history)
-                    await session.commit()
-                    
-                    # Referrer ga xabar yuborish
-                    try:
-                        await bot.send_message(
-                            referred_by_id,
-                            f"🎉 Yangi foydalanuvchi sizning havolangiz orqali qo'shildi!\n"
-                            f"💰 Balansingizga +{reward:,.0f} UZS qo'shildi"
-                        )
-                    except:
-                        pass
-        else:
-            user.language = lang
-            await session.commit()
+                except:
+                    pass
+    else:
+        user.language = lang
+        await session.commit()
+        user_profiles.put(user)
 
     await callback.answer()
     await send_main_menu(callback.message, lang)
 
 
 async def send_main_menu(message: types.Message, lang: str):
-    buttons = [
-        [InlineKeyboardButton(text=get_text(lang, "convert_btn"), callback_data="start_convert")],
-        [InlineKeyboardButton(text=get_text(lang, "promo_btn"), callback_data="enter_promo")],
-        [InlineKeyboardButton(text=get_text(lang, "referral_btn"), callback_data="my_referral")],
-        [InlineKeyboardButton(text=get_text(lang, "profile_btn"), callback_data="my_profile")]
-    ]
-
-    # Faqat admin uchun tugma qo'shamiz
-    if message.from_user.id == ADMIN_ID:
-        buttons.append([InlineKeyboardButton(text="⚙️ Admin Panel", callback_data="admin_settings")])
-
-    main_kb = InlineKeyboardMarkup(inline_keyboard=buttons)
-
-    await message.answer(
-        f"{get_text(lang, 'start')}\n\n{get_text(lang, 'choose_action')}",
-        reply_markup=main_kb
-    )
+    # Faqat admin uchun "Admin Panel" tugmasi bor variant
+    text, main_kb = screens.get(lang, MAIN, is_admin=message.from_user.id == ADMIN_ID)
+    await message.answer(text, reply_markup=main_kb)
 
 
 # --- Profil ko'rsatish ---
 @dp.callback_query(F.data == "my_profile")
-async def show_profile(callback: types.CallbackQuery):
+async def show_profile(callback: types.CallbackQuery, profile: UserProfile | None):
     # Obunani tekshirish
     if not await check_subscription(callback.from_user.id):
-        async for session in get_session():
-            stmt = select(User).where(User.telegram_id == callback.from_user.id)
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
-            lang = user.language if user else "uz"
         await callback.answer()
-        await send_subscription_required(callback.message, lang)
+        await send_subscription_required(callback.message, user_language(profile))
         return
     
-    async for session in get_session():
-        stmt = select(User).where(User.telegram_id == callback.from_user.id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            await callback.answer("❌ Foydalanuvchi topilmadi", show_alert=True)
-            return
-        
-        lang = user.language or "uz"
-        
-        # Referal statistikasi
-        from sqlalchemy import func
-        ref_count_stmt = select(func.count(User.id)).where(User.referred_by == user.telegram_id)
-        ref_count = (await session.execute(ref_count_stmt)).scalar() or 0
-        
-        profile_text = get_text(lang, "profile_text").format(
-            name=user.first_name or "User",
-            username=f"@{user.username}" if user.username else "—",
-            balance=user.balance or 0,
-            total_earned=user.total_earned or 0,
-            referrals=ref_count,
-            ref_code=user.referral_code or "—"
-        )
-        
-        kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🏠 " + get_text(lang, "back_to_menu"), callback_data="back_to_menu")]
-        ])
-        
-        try:
-            await callback.message.edit_text(profile_text, reply_markup=kb, parse_mode="HTML")
-        except:
-            await callback.message.answer(profile_text, reply_markup=kb, parse_mode="HTML")
-        await callback.answer()
+    user = profile
+    
+    if not user:
+        await callback.answer("❌ Foydalanuvchi topilmadi", show_alert=True)
+        return
+    
+    lang = user.language or "uz"
+    
+    # Referal statistikasi (users.referral_count - COUNT(*) so'rovisiz)
+    ref_count = user.referral_count or 0
+    
+    profile_text = get_text(lang, "profile_text").format(
+        name=user.first_name or "User",
+        username=f"@{user.username}" if user.username else "—",
+        balance=user.balance or 0,
+        total_earned=user.total_earned or 0,
+        referrals=ref_count,
+        ref_code=user.referral_code or "—"
+    )
+    
+    _, kb = screens.get(lang, BACK)
+    
+    try:
+        await callback.message.edit_text(profile_text, reply_markup=kb, parse_mode="HTML")
+    except:
+        await callback.message.answer(profile_text, reply_markup=kb, parse_mode="HTML")
+    await callback.answer()
 
 
 # --- Referal havolani ko'rsatish ---
 @dp.callback_query(F.data == "my_referral")
-async def show_referral(callback: types.CallbackQuery):
+async def show_referral(callback: types.CallbackQuery, profile: UserProfile | None):
     global BOT_INFO
     
     # Obunani tekshirish
     if not await check_subscription(callback.from_user.id):
-        async for session in get_session():
-            stmt = select(User).where(User.telegram_id == callback.from_user.id)
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
-            lang = user.language if user else "uz"
         await callback.answer()
-        await send_subscription_required(callback.message, lang)
+        await send_subscription_required(callback.message, user_language(profile))
         return
     
-    async for session in get_session():
-        stmt = select(User).where(User.telegram_id == callback.from_user.id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            await callback.answer("❌ Foydalanuvchi topilmadi", show_alert=True)
-            return
-        
-        lang = user.language or "uz"
-        
-        # Referal statistikasi
-        from sqlalchemy import func
-        ref_count_stmt = select(func.count(User.id)).where(User.referred_by == user.telegram_id)
-        ref_count = (await session.execute(ref_count_stmt)).scalar() or 0
-        
-        # Settings dan referal mukofotini olish
-        settings_stmt = select(Settings).limit(1)
-        settings = (await session.execute(settings_stmt)).scalar_one_or_none()
-        reward = settings.referral_reward if settings else 1000.0
-        
-        # Bot username olish (cache qilish)
-        if not BOT_INFO:
-            BOT_INFO = await bot.get_me()
-        
-        ref_link = f"https://t.me/{BOT_INFO.username}?start={user.referral_code}"
-        
-        referral_text = get_text(lang, "referral_text").format(
-            link=ref_link,
-            reward=f"{reward:,.0f}",
-            count=ref_count,
-            earned=f"{user.total_earned or 0:,.0f}"
-        )
-        
-        kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🏠 " + get_text(lang, "back_to_menu"), callback_data="back_to_menu")]
-        ])
-        
-        try:
-            await callback.message.edit_text(referral_text, reply_markup=kb, parse_mode="HTML")
-        except:
-            await callback.message.answer(referral_text, reply_markup=kb, parse_mode="HTML")
-        await callback.answer()
+    user = profile
+    
+    if not user:
+        await callback.answer("❌ Foydalanuvchi topilmadi", show_alert=True)
+        return
+    
+    lang = user.language or "uz"
+    
+    # Referal statistikasi (users.referral_count - COUNT(*) so'rovisiz)
+    ref_count = user.referral_count or 0
+    
+    # Referal mukofoti (xotiradagi sozlamalardan)
+    reward = settings_store.get().referral_reward
+    
+    # Bot username olish (cache qilish)
+    if not BOT_INFO:
+        BOT_INFO = await bot.get_me()
+    
+    ref_link = f"https://t.me/{BOT_INFO.username}?start={user.referral_code}"
+    
+    referral_text = get_text(lang, "referral_text").format(
+        link=ref_link,
+        reward=f"{reward:,.0f}",
+        count=ref_count,
+        earned=f"{user.total_earned or 0:,.0f}"
+    )
+    
+    _, kb = screens.get(lang, BACK)
+    
+    try:
+        await callback.message.edit_text(referral_text, reply_markup=kb, parse_mode="HTML")
+    except:
+        await callback.message.answer(referral_text, reply_markup=kb, parse_mode="HTML")
+    await callback.answer()
 
 
 # --- Asosiy menyuga qaytish ---
 @dp.callback_query(F.data == "back_to_menu")
-async def back_to_menu(callback: types.CallbackQuery):
+async def back_to_menu(callback: types.CallbackQuery, profile: UserProfile | None):
     # Obunani tekshirish
     if not await check_subscription(callback.from_user.id):
-        async for session in get_session():
-            stmt = select(User).where(User.telegram_id == callback.from_user.id)
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
-            lang = user.language if user else "uz"
         await callback.answer()
-        await send_subscription_required(callback.message, lang)
+        await send_subscription_required(callback.message, user_language(profile))
         return
     
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+    lang = user_language(profile)
     
-    # Menyuni edit qilamiz
-    buttons = [
-        [InlineKeyboardButton(text=get_text(lang, "convert_btn"), callback_data="start_convert")],
-        [InlineKeyboardButton(text=get_text(lang, "referral_btn"), callback_data="my_referral")],
-        [InlineKeyboardButton(text=get_text(lang, "profile_btn"), callback_data="my_profile")]
-    ]
-
-    # Faqat admin uchun tugma qo'shamiz
-    if callback.from_user.id == ADMIN_ID:
-        buttons.append([InlineKeyboardButton(text="⚙️ Admin Panel", callback_data="admin_settings")])
-
-    main_kb = InlineKeyboardMarkup(inline_keyboard=buttons)
+    # Menyuni edit qilamiz (faqat admin uchun "Admin Panel" tugmasi bor variant)
+    text, main_kb = screens.get(lang, MENU, is_admin=callback.from_user.id == ADMIN_ID)
     
     try:
-        await callback.message.edit_text(
-            f"{get_text(lang, 'start')}\n\n{get_text(lang, 'choose_action')}",
-            reply_markup=main_kb
-        )
+        await callback.message.edit_text(text, reply_markup=main_kb)
     except:
-        await callback.message.answer(
-            f"{get_text(lang, 'start')}\n\n{get_text(lang, 'choose_action')}",
-            reply_markup=main_kb
-        )
+        await callback.message.answer(text, reply_markup=main_kb)
     await callback.answer()
 
 
 # --- Ommaviy oferta ---
 @dp.callback_query(F.data == "start_convert")
-async def confirm_offer(callback: types.CallbackQuery):
+async def confirm_offer(callback: types.CallbackQuery, profile: UserProfile | None):
     # Obunani tekshirish
     if not await check_subscription(callback.from_user.id):
-        async for session in get_session():
-            stmt = select(User).where(User.telegram_id == callback.from_user.id)
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
-            lang = user.language if user else "uz"
         await callback.answer()
-        await send_subscription_required(callback.message, lang)
+        await send_subscription_required(callback.message, user_language(profile))
         return
     
-    async for session in get_session():
-        user_lang_stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(user_lang_stmt)).scalar() or "uz"
+    lang = user_language(profile)
 
-        settings_stmt = select(Settings).limit(1)
-        settings = (await session.execute(settings_stmt)).scalar_one_or_none()
-
-    offer_url = get_offer_link(lang, settings)
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=get_text(lang, "view_offer"), url=offer_url)],
-        [InlineKeyboardButton(text=get_text(lang, "confirm"), callback_data="confirm_offer")],
-        [InlineKeyboardButton(text="🏠 " + get_text(lang, "back_to_menu"), callback_data="back_to_menu")]
-    ])
+    # Oferta linklari sozlamalar bilan birga yuklanadi (settings_store)
+    text, kb = screens.get(lang, OFFER)
 
     try:
-        await callback.message.edit_text(get_text(lang, "offer_text"), reply_markup=kb)
+        await callback.message.edit_text(text, reply_markup=kb)
     except:
-        await callback.message.answer(get_text(lang, "offer_text"), reply_markup=kb)
+        await callback.message.answer(text, reply_markup=kb)
     await callback.answer()
 
 
 # --- Faylni so''rash ---
 @dp.callback_query(F.data == "confirm_offer")
-async def ask_file(callback: types.CallbackQuery):
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+async def ask_file(callback: types.CallbackQuery, profile: UserProfile | None):
+    lang = user_language(profile)
     
     await callback.answer()
     await callback.message.answer(get_text(lang, "send_file"))
@@ -430,29 +450,61 @@ async def ask_file(callback: types.CallbackQuery):
 
 # --- Faylni qabul qilish ---
 @dp.message(F.document)
-async def handle_file(message: types.Message):
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == message.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+async def handle_file(message: types.Message, profile: UserProfile | None):
+    lang = user_language(profile)
 
     doc = message.document
     if not validate_docx(doc.file_name):
         await message.answer(get_text(lang, "not_docx"))
         return
+    
+    # Juda katta fayl - yuklab olinmasdan rad etiladi
+    if not docx_size_allowed(doc.file_size):
+        await message.answer(get_text(lang, "file_too_large").format(max=f"{DOCX_MAX_FILE_MB:g}"))
+        return
 
-    # User ID bo'yicha papka yaratish
+    # User ID bo'yicha papka
     user_folder = f"files/{message.from_user.id}"
-    ensure_dir(user_folder)
-    
     file_path = f"{user_folder}/{doc.file_name}"
     
     try:
-        # Faylni yuklab olish
-        file_info = await bot.get_file(doc.file_id)
-        await bot.download_file(file_info.file_path, destination=file_path)
+        # Shu file_unique_id oldin qayta ishlangan bo'lsa - yuklab olinmaydi va parse qilinmaydi
+        digest, analysis = await lookup_file(doc.file_unique_id)
+        parsed = None
+        file_data = None
         
-        # Faylni tahlil qilish (rasm va formulalarni aniqlash)
-        analysis = analyze_docx_file(file_path)
+        if analysis is None:
+            # Faylni yuklab olish
+            file_info = await bot.get_file(doc.file_id)
+            
+            if keep_in_memory(doc.file_size):
+                # Kichik fayl - diskka yozilmaydi, xotirada qoladi
+                buffer = await bot.download_file(file_info.file_path)
+                file_data = buffer.getvalue()
+                digest = await asyncio.to_thread(bytes_sha256, file_data)
+            else:
+                ensure_dir(user_folder)
+                await bot.download_file(file_info.file_path, destination=file_path)
+                digest = await asyncio.to_thread(file_sha256, file_path)
+            
+            # Arxiv tuzilishini tekshirish (magic baytlar, central directory) - parse qilishdan oldin
+            rejection = await asyncio.to_thread(inspect_docx, file_data if file_data is not None else file_path)
+            if rejection:
+                if file_data is None and os.path.exists(file_path):
+                    os.remove(file_path)
+                await message.answer(get_text(lang, rejection))
+                return
+            
+            # Bir xil tarkibli fayl oldin tahlil qilingan bo'lsa - keshdan olinadi
+            analysis = conversion_cache.get_analysis(digest)
+            
+            if analysis is None:
+                # Faylni bir marta parse qilish (savollar + rasm/formula tahlili)
+                parsed = await run_in_pool(parse_docx_file, file_data if file_data is not None else file_path)
+                analysis = parsed["analysis"]
+                conversion_cache.put_analysis(digest, analysis)
+            
+            await remember_file(doc.file_unique_id, digest, analysis, doc.file_size)
 
         # Gruh yoki bitta fayl
         user_id = message.from_user.id
@@ -466,32 +518,40 @@ async def handle_file(message: types.Message):
             group_id = f"single_{message.message_id}"
             key = f"{user_id}_{group_id}"
         
-        if key not in pending_group_files:
-            pending_group_files[key] = {
-                "files": [],
-                "analyses": [],  # Har bir faylning tahlili
+        order = pending_orders.get(key)
+        if order is None:
+            order = pending_orders.add(key, {
+                "files": [],  # Har bir fayl uchun dict (quyida)
                 "total_price": 0,
                 "lang": lang,
-                "chat_id": message.chat.id
-            }
+                "chat_id": message.chat.id,
+                "formats": list(DEFAULT_FORMATS)  # Tanlangan chiqish formatlari
+            })
             # Eski taskni bekor qilish
             if key in group_timeout_tasks and not group_timeout_tasks[key].done():
                 group_timeout_tasks[key].cancel()
         
-        pending_group_files[key]["files"].append(file_path)
-        pending_group_files[key]["analyses"].append(analysis)
-        pending_group_files[key]["total_price"] += FILE_PRICE
+        order["files"].append({
+            "path": file_path,  # Diskdagi joyi (xotirada bo'lsa - faqat nom uchun)
+            "data": file_data,  # Xotiradagi DOCX baytlari (kichik fayllar)
+            "file_id": doc.file_id,  # Fayl yuklab olinmagan bo'lsa keyin yuklab olish uchun
+            "size": doc.file_size,
+            "digest": digest,  # SHA-256 (natija keshi uchun)
+            "analysis": analysis,  # Rasm/formula tahlili
+            "parsed": parsed,  # Parse natijasi (to'lovdan keyin qayta parse qilmaslik uchun)
+        })
+        order["total_price"] += FILE_PRICE
         
-        file_count = len(pending_group_files[key]["files"])
+        file_count = len(order["files"])
         await message.answer(f"📁 Fayl qabul qilindi ({file_count}/...)")
         
         # Timeout - 3 sekund kutib, yangi fayl kelmasa invoice yubor yoki admin bo'lsa konvertatsiya qil
         async def process_group_after_delay():
             try:
                 await asyncio.sleep(3.0)  # 3 sekund kutish
-                if key in pending_group_files:
-                    # Avval analiz natijalarini ko'rsatish
-                    await show_file_analysis(key, lang, message.from_user.id)
+                if key in pending_orders:
+                    # Avval chiqish formatlarini tanlash, keyin analiz natijalari
+                    await send_format_picker(key, lang)
             except asyncio.CancelledError:
                 pass  # Task bekor qilindi, yangi fayllar kelmoqda
             except Exception as e:
@@ -509,13 +569,121 @@ async def handle_file(message: types.Message):
         await message.answer(f"❌ Xatolik: {e}")
 
 
+def build_format_keyboard(key: str, lang: str, selected: list) -> InlineKeyboardMarkup:
+    """Chiqish formatlari tanlash klaviaturasi (tanlanganlari ✅ bilan)"""
+    buttons = []
+    row = []
+    for fmt in WRITERS:
+        mark = "✅" if fmt in selected else "▫️"
+        row.append(InlineKeyboardButton(text=f"{mark} {FORMAT_LABELS[fmt]}", callback_data=f"fmt_{fmt}_{key}"))
+        if len(row) == 2:
+            buttons.append(row)
+            row = []
+    if row:
+        buttons.append(row)
+    
+    buttons.append([InlineKeyboardButton(text=get_text(lang, "formats_continue"), callback_data=f"fmtdone_{key}")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def arm_order_timeout(key: str, lang: str, telegram_id: int):
+    """
+    Buyurtma uchun 30 daqiqalik timeout (eskisi bo'lsa bekor qilinadi).
+
+    Format tanlash xabari yuborilganda yoqiladi va invoice yuborilganda qayta boshlanadi -
+    user "Davom etish"/to'lovni bosmasa fayllar (xotiradagi baytlar ham) abadiy qolib ketmaydi.
+    """
+    async def payment_timeout_handler():
+        try:
+            await asyncio.sleep(1800)  # 30 daqiqa = 1800 sekund
+            if key in pending_orders:
+                # Fayllarni o'chirish
+                data = pending_orders.get(key)
+                if data:
+                    # Fayllarni o'chirish (bo'sh qolgan user papkasi bilan)
+                    remove_order_files(data.get("files", []))
+                    
+                    # Userga xabar yuborish
+                    try:
+                        await bot.send_message(telegram_id, get_text(lang, "payment_timeout"))
+                    except:
+                        pass
+                
+                # Pending groupni tozalash
+                drop_pending_order(key)
+        except asyncio.CancelledError:
+            pass  # Task bekor qilindi (to'lov amalga oshirildi yoki timeout qayta boshlandi)
+        except Exception as e:
+            print(f"Payment timeout xatosi: {e}")
+    
+    old_task = payment_timeout_tasks.get(key)
+    if old_task is not None and not old_task.done():
+        old_task.cancel()
+    payment_timeout_tasks[key] = asyncio.create_task(payment_timeout_handler())
+
+
+async def send_format_picker(key: str, lang: str):
+    """Buyurtma uchun chiqish formatlarini tanlash xabarini yuboradi"""
+    data = pending_orders.get(key)
+    if not data:
+        return
+    
+    # Tanlov/tasdiq/to'lov bosilmasa buyurtma 30 daqiqadan keyin tozalanadi
+    arm_order_timeout(key, lang, int(key.split("_")[0]))
+    
+    await bot.send_message(
+        chat_id=data["chat_id"],
+        text=get_text(lang, "choose_formats"),
+        reply_markup=build_format_keyboard(key, lang, data["formats"]),
+        parse_mode="HTML"
+    )
+
+
+@dp.callback_query(F.data.startswith("fmtdone_"))
+async def formats_done_handler(callback: types.CallbackQuery):
+    key = callback.data.replace("fmtdone_", "", 1)
+    
+    data = pending_orders.get(key)
+    if not data:
+        await callback.answer("❌ Fayl topilmadi yoki vaqt tugadi", show_alert=True)
+        return
+    
+    data["formats"] = normalize_formats(data["formats"])
+    await callback.message.delete()
+    await callback.answer()
+    await show_file_analysis(key, data["lang"], callback.from_user.id)
+
+
+@dp.callback_query(F.data.startswith("fmt_"))
+async def toggle_format_handler(callback: types.CallbackQuery):
+    fmt, key = callback.data.replace("fmt_", "", 1).split("_", 1)
+    
+    data = pending_orders.get(key)
+    if not data or fmt not in WRITERS:
+        await callback.answer("❌ Fayl topilmadi yoki vaqt tugadi", show_alert=True)
+        return
+    
+    selected = data["formats"]
+    if fmt in selected:
+        # Kamida bitta format tanlangan bo'lishi kerak
+        if len(selected) == 1:
+            await callback.answer(get_text(data["lang"], "formats_empty"), show_alert=True)
+            return
+        selected.remove(fmt)
+    else:
+        selected.append(fmt)
+    
+    await callback.message.edit_reply_markup(reply_markup=build_format_keyboard(key, data["lang"], selected))
+    await callback.answer()
+
+
 async def show_file_analysis(key: str, lang: str, user_id: int):
     """Fayl tahlilini ko'rsatish va tasdiqlash so'rash"""
-    data = pending_group_files.get(key)
+    data = pending_orders.get(key)
     if not data:
         return
     
-    analyses = data.get("analyses", [])
+    analyses = [item["analysis"] for item in data.get("files", [])]
     
     # Barcha fayllarning umumiy statistikasi
     total_questions = sum(a['total_questions'] for a in analyses)
@@ -558,12 +726,9 @@ async def show_file_analysis(key: str, lang: str, user_id: int):
         # Muammo yo'q - to'g'ridan-to'g'ri to'lov/konvertatsiyaga o'tish
         if user_id == ADMIN_ID:
             files_to_convert = data.get("files", [])
-            await process_conversion_direct(data["chat_id"], files_to_convert, lang)
+            await process_conversion_direct(data["chat_id"], files_to_convert, lang, data.get("formats"))
             # Pending groupni tozalash
-            if key in pending_group_files:
-                del pending_group_files[key]
-            if key in group_timeout_tasks:
-                del group_timeout_tasks[key]
+            drop_pending_order(key)
         else:
             await send_group_invoice(key, lang)
 
@@ -573,7 +738,7 @@ async def show_file_analysis(key: str, lang: str, user_id: int):
 async def confirm_convert_handler(callback: types.CallbackQuery):
     key = callback.data.replace("confirm_convert_", "")
     
-    data = pending_group_files.get(key)
+    data = pending_orders.get(key)
     if not data:
         await callback.answer("❌ Fayl topilmadi yoki vaqt tugadi", show_alert=True)
         return
@@ -583,13 +748,10 @@ async def confirm_convert_handler(callback: types.CallbackQuery):
     # Admin uchun to'lovsiz konvertatsiya
     if callback.from_user.id == ADMIN_ID:
         files_to_convert = data.get("files", [])
-        await process_conversion_direct(callback.message.chat.id, files_to_convert, lang)
+        await process_conversion_direct(callback.message.chat.id, files_to_convert, lang, data.get("formats"))
         await callback.message.delete()
         # Pending groupni tozalash
-        if key in pending_group_files:
-            del pending_group_files[key]
-        if key in group_timeout_tasks:
-            del group_timeout_tasks[key]
+        drop_pending_order(key)
     else:
         # Oddiy user uchun to'lov so'rash
         await callback.message.delete()
@@ -603,35 +765,18 @@ async def confirm_convert_handler(callback: types.CallbackQuery):
 async def cancel_convert_handler(callback: types.CallbackQuery):
     key = callback.data.replace("cancel_convert_", "")
     
-    data = pending_group_files.get(key)
+    data = pending_orders.get(key)
     if not data:
         await callback.answer("❌ Fayl topilmadi", show_alert=True)
         return
     
     lang = data["lang"]
     
-    # Fayllarni o'chirish
-    files = data.get("files", [])
-    for file_path in files:
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except:
-            pass
-    
-    # User papkasini o'chirish (bo'sh bo'lsa)
-    user_folder = f"files/{callback.from_user.id}"
-    try:
-        if os.path.exists(user_folder) and not os.listdir(user_folder):
-            os.rmdir(user_folder)
-    except:
-        pass
+    # Fayllarni o'chirish (bo'sh qolgan user papkasi bilan)
+    remove_order_files(data.get("files", []))
     
     # Pending groupni tozalash
-    if key in pending_group_files:
-        del pending_group_files[key]
-    if key in group_timeout_tasks:
-        del group_timeout_tasks[key]
+    drop_pending_order(key)
     
     await callback.message.delete()
     await callback.message.answer("❌ Konvertatsiya bekor qilindi. Fayllar o'chirildi.")
@@ -643,7 +788,7 @@ async def send_group_invoice(key: str, lang: str):
     import json
     import uuid
     
-    data = pending_group_files.get(key)
+    data = pending_orders.get(key)
     if not data:
         return
     
@@ -654,18 +799,16 @@ async def send_group_invoice(key: str, lang: str):
         # Invoice ID yaratish
         invoice_id = str(uuid.uuid4())
         
-        # Invoice ID ni data ga qo'shish (keyinchalik topish uchun)
-        data["invoice_id"] = invoice_id
+        # Invoice ID ni buyurtmaga biriktirish (invoice_id indeksi orqali O(1) topiladi)
+        pending_orders.set_invoice(key, invoice_id)
         
         # User balansini olish
         user_id_str = key.split("_")[0]
         telegram_id = int(user_id_str)
         
         async for session in get_session():
-            stmt = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(stmt)
-            user = result.scalar_one_or_none()
-            user_balance = user.balance if user else 0.0
+            profile = await load_profile(session, telegram_id)
+            user_balance = profile.balance if profile else 0.0
         
         # To'lov manbai tanlash
         if user_balance >= total_price:
@@ -713,64 +856,13 @@ async def send_group_invoice(key: str, lang: str):
             # Faqat Click (balans 0 yoki yetarli emas)
             await send_click_invoice(invoice_id, total_price, file_count, lang, data["chat_id"])
         
-        # 30 daqiqalik to'lov timeout yaratish
-        async def payment_timeout_handler():
-            try:
-                await asyncio.sleep(1800)  # 30 daqiqa = 1800 sekund
-                if key in pending_group_files:
-                    # Fayllarni o'chirish
-                    data = pending_group_files.get(key)
-                    if data:
-                        files_to_delete = data.get("files", [])
-                        for file_path in files_to_delete:
-                            try:
-                                import os
-                                if os.path.exists(file_path):
-                                    os.remove(file_path)
-                                # TXT faylni ham o'chirish
-                                txt_path = file_path.replace(".docx", ".txt")
-                                if os.path.exists(txt_path):
-                                    os.remove(txt_path)
-                            except Exception as e:
-                                print(f"Fayl o'chirishda xatolik: {e}")
-                        
-                        # User papkasini o'chirish (bo'sh bo'lsa)
-                        try:
-                            user_folder = f"files/{telegram_id}"
-                            if os.path.exists(user_folder) and not os.listdir(user_folder):
-                                os.rmdir(user_folder)
-                        except Exception as e:
-                            print(f"Papka o'chirishda xatolik: {e}")
-                        
-                        # Userga xabar yuborish
-                        try:
-                            await bot.send_message(telegram_id, get_text(lang, "payment_timeout"))
-                        except:
-                            pass
-                    
-                    # Pending groupni tozalash
-                    if key in pending_group_files:
-                        del pending_group_files[key]
-                    if key in group_timeout_tasks:
-                        del group_timeout_tasks[key]
-                    if key in payment_timeout_tasks:
-                        del payment_timeout_tasks[key]
-            except asyncio.CancelledError:
-                pass  # Task bekor qilindi (to'lov amalga oshirildi)
-            except Exception as e:
-                print(f"Payment timeout xatosi: {e}")
-        
-        # Timeout taskni ishga tushirish
-        timeout_task = asyncio.create_task(payment_timeout_handler())
-        payment_timeout_tasks[key] = timeout_task
+        # 30 daqiqalik to'lov timeout (invoice yuborilgan paytdan qayta boshlanadi)
+        arm_order_timeout(key, lang, telegram_id)
         
     except Exception as e:
         print(f"Invoice yuborishda xatolik: {type(e).__name__}: {e}")
         # Faqat error bo'lsa pending groupni o'chirish
-        if key in pending_group_files:
-            del pending_group_files[key]
-        if key in group_timeout_tasks:
-            del group_timeout_tasks[key]
+        drop_pending_order(key)
 
 
 async def send_click_invoice(invoice_id: str, total_price: float, file_count: int, lang: str, chat_id: int):
@@ -818,88 +910,69 @@ async def send_click_invoice(invoice_id: str, total_price: float, file_count: in
 
 # --- To'lov manbai callback handlerlari ---
 @dp.callback_query(F.data.startswith("pay_balance_"))
-async def pay_with_balance(callback: types.CallbackQuery):
+async def pay_with_balance(callback: types.CallbackQuery, session: AsyncSession, profile: UserProfile | None):
     """Faqat balansdan to'lash"""
     invoice_id = callback.data.split("pay_balance_")[1]
     
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+    lang = user_language(profile)
     
     # Invoice topish
-    files_to_convert = []
-    key_to_delete = None
-    total_price = 0
-    
-    for key, group_data in list(pending_group_files.items()):
-        if group_data.get("invoice_id") == invoice_id:
-            files_to_convert = group_data.get("files", [])
-            total_price = group_data.get("total_price", 0)
-            key_to_delete = key
-            break
+    key, order = pending_orders.by_invoice(invoice_id)
+    files_to_convert = order.get("files", []) if order else []
     
     if not files_to_convert:
         await callback.answer("❌ Fayllar topilmadi", show_alert=True)
         return
     
-    # Balansdan pul yechish
-    async for session in get_session():
-        stmt = select(User).where(User.telegram_id == callback.from_user.id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if not user or user.balance < total_price:
-            await callback.answer("❌ Balansda mablag' yetarli emas", show_alert=True)
-            return
-        
-        user.balance -= total_price
-        await session.commit()
+    # Ikki marta bosilsa - ikkinchisi shu buyurtma uchun qayta yechmaydi
+    if order.get("paying"):
+        await callback.answer()
+        return
+    order["paying"] = True
+    
+    # Balansdan pul yechish - tekshirish va yechish bitta UPDATE da
+    total_price = order.get("total_price", 0)
+    row = await ledger.debit(session, callback.from_user.id, total_price, ledger.PAYMENT, invoice_id)
+    
+    if row is None:
+        await session.rollback()
+        order["paying"] = False
+        await callback.answer("❌ Balansda mablag' yetarli emas", show_alert=True)
+        return
+    
+    await session.commit()
+    ledger.remember(callback.from_user.id, row)
     
     await callback.answer("✅ To'lov muvaffaqiyatli")
     await callback.message.delete()
     await callback.message.answer(get_text(lang, "paid"))
     
-    # Payment timeout taskni bekor qilish
-    if key_to_delete and key_to_delete in payment_timeout_tasks:
-        payment_timeout_tasks[key_to_delete].cancel()
-        del payment_timeout_tasks[key_to_delete]
+    # Pending groupni tozalash (payment timeout task ham bekor qilinadi)
+    drop_pending_order(key)
     
     # Fayllarni konvertatsiya qilish
-    await process_conversion(callback.message, files_to_convert, lang)
-    
-    # Pending groupni tozalash
-    if key_to_delete:
-        if key_to_delete in pending_group_files:
-            del pending_group_files[key_to_delete]
-        if key_to_delete in group_timeout_tasks:
-            del group_timeout_tasks[key_to_delete]
+    await process_conversion(callback.message, files_to_convert, lang, order.get("formats"))
 
 
 @dp.callback_query(F.data.startswith("pay_partial_"))
-async def pay_with_partial(callback: types.CallbackQuery):
+async def pay_with_partial(callback: types.CallbackQuery, profile: UserProfile | None):
     """Qisman balans + Click"""
     invoice_id = callback.data.split("pay_partial_")[1]
     
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+    lang = user_language(profile)
     
     # Invoice topish
-    total_price = 0
-    file_count = 0
+    key, order = pending_orders.by_invoice(invoice_id)
+    if not order or order.get("paying"):
+        await callback.answer("❌ Fayllar topilmadi", show_alert=True)
+        return
     
-    for key, group_data in list(pending_group_files.items()):
-        if group_data.get("invoice_id") == invoice_id:
-            total_price = group_data.get("total_price", 0)
-            file_count = len(group_data.get("files", []))
-            break
+    total_price = order.get("total_price", 0)
+    file_count = len(order.get("files", []))
     
     # User balansini olish
-    async for session in get_session():
-        stmt = select(User).where(User.telegram_id == callback.from_user.id)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-        user_balance = user.balance if user else 0.0
+    user = profile
+    user_balance = user.balance if user else 0.0
     
     remaining = total_price - user_balance
     
@@ -914,23 +987,20 @@ async def pay_with_partial(callback: types.CallbackQuery):
 
 
 @dp.callback_query(F.data.startswith("pay_click_"))
-async def pay_with_click_only(callback: types.CallbackQuery):
+async def pay_with_click_only(callback: types.CallbackQuery, profile: UserProfile | None):
     """Faqat Click orqali to'lash"""
     invoice_id = callback.data.split("pay_click_")[1]
     
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == callback.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+    lang = user_language(profile)
     
     # Invoice topish
-    total_price = 0
-    file_count = 0
+    key, order = pending_orders.by_invoice(invoice_id)
+    if not order or order.get("paying"):
+        await callback.answer("❌ Fayllar topilmadi", show_alert=True)
+        return
     
-    for key, group_data in list(pending_group_files.items()):
-        if group_data.get("invoice_id") == invoice_id:
-            total_price = group_data.get("total_price", 0)
-            file_count = len(group_data.get("files", []))
-            break
+    total_price = order.get("total_price", 0)
+    file_count = len(order.get("files", []))
     
     # Click invoice yuborish
     await callback.message.delete()
@@ -938,157 +1008,224 @@ async def pay_with_click_only(callback: types.CallbackQuery):
     await callback.answer("💳 Click orqali to'lang")
 
 
-async def process_conversion(message: types.Message, files_to_convert: list, lang: str):
+async def convert_order_file(item: dict, formats: list | None = None) -> dict:
+    """
+    Buyurtmadagi bitta faylni tanlangan formatlarga aylantiradi.
+    
+    Keshda bor formatlar qayta yaratilmaydi, qolganlari bitta parse natijasidan
+    birga yoziladi. Natija diskka yozilmaydi.
+    
+    Returns:
+        {format: bytes}
+    """
+    formats = normalize_formats(formats)
+    digest = item.get("digest")
+    
+    outputs = {}
+    if digest:
+        for fmt in formats:
+            cached = conversion_cache.get_output(digest, fmt)
+            if cached is not None:
+                outputs[fmt] = cached
+    
+    missing = [fmt for fmt in formats if fmt not in outputs]
+    if not missing:
+        return outputs
+    
+    source = item.get("data")
+    if source is None:
+        source = item["path"]
+        
+        # Fayl indeks orqali qabul qilingan (yuklab olinmagan) bo'lsa - endi yuklab olamiz
+        if not os.path.exists(source):
+            if not item.get("file_id"):
+                raise FileNotFoundError(source)
+            file_info = await bot.get_file(item["file_id"])
+            if keep_in_memory(item.get("size")):
+                source = (await bot.download_file(file_info.file_path)).getvalue()
+            else:
+                ensure_dir(os.path.dirname(source))
+                await bot.download_file(file_info.file_path, destination=source)
+    
+    # Oldindan parse qilingan natija bo'lsa - qayta parse qilinmaydi (faylni workerga uzatish shart emas)
+    parsed = item.get("parsed")
+    rendered = await run_in_pool(convert_docx_to_formats, None if parsed is not None else source, missing, parsed)
+    
+    for fmt, data in rendered.items():
+        outputs[fmt] = data
+        if digest:
+            conversion_cache.put_output(digest, fmt, data)
+    return {fmt: outputs[fmt] for fmt in formats}
+
+
+def start_order_conversion(files_to_convert: list, formats: list | None, user_id: int, priority: str = PAID) -> list:
+    """
+    Buyurtma fayllarini parallel konvertatsiya qilishni boshlaydi.
+    
+    Bir vaqtda buyurtma ichida CONVERT_ORDER_CONCURRENCY tadan ko'p fayl ishlanmaydi.
+    Umumiy slotlarni (CONVERT_GLOBAL_CONCURRENCY) conversion_scheduler userlar va
+    ustuvorlik sinflari bo'yicha adolatli taqsimlaydi. Tasklar fayllar tartibida
+    qaytariladi - ularni ketma-ket kutib, natijalar asl tartibda yuboriladi
+    (oldingi fayl yuborilayotganda keyingilari konvertatsiya qilinaveradi).
+    """
+    order_semaphore = asyncio.Semaphore(CONVERT_ORDER_CONCURRENCY)
+    
+    async def convert_limited(item: dict) -> dict:
+        async with order_semaphore:
+            async with conversion_scheduler.slot(user_id, priority):
+                return await convert_order_file(item, formats)
+    
+    return [asyncio.create_task(convert_limited(item)) for item in files_to_convert]
+
+
+def build_result_caption(file_path: str, lang: str, extension: str = "txt") -> tuple:
+    """Natija fayl nomi va caption'ini qaytaradi"""
+    return result_caption(BOT_INFO, file_path, lang, extension)
+
+
+async def enqueue_conversion(chat_id: int, files_to_convert: list, lang: str, formats: list | None = None,
+                             priority: str = PAID):
+    """To'langan fayllarni conversion_jobs navbatiga qo'yadi - konvertatsiyani worker.py bajaradi"""
+    for item in files_to_convert:
+        item["data"] = None  # Worker faylni diskdan (yoki file_id orqali) oladi
+    
+    try:
+        await enqueue_order(files_to_convert, chat_id, chat_id, lang, formats, priority)
+    except Exception as e:
+        print(f"Navbatga qo'shishda xatolik: chat_id={chat_id}, error={e}")
+        await bot.send_message(chat_id, f"{get_text(lang, 'error')} {e}")
+        return
+    
+    await bot.send_message(chat_id, get_text(lang, "queued").format(count=len(files_to_convert)))
+
+
+async def process_conversion(message: types.Message, files_to_convert: list, lang: str, formats: list | None = None):
     """Fayllarni konvertatsiya qilish"""
-    import os
+    if CONVERT_QUEUE:
+        await enqueue_conversion(message.chat.id, files_to_convert, lang, formats)
+        return
     
     await message.answer(f"📦 {len(files_to_convert)}ta fayl tayyorlanmoqda...")
     
-    for file_path in files_to_convert:
-        try:
-            txt_path = file_path.replace(".docx", ".txt")
-            result_path = convert_docx_to_txt(file_path, txt_path)
-            
-            # Fayl nomini bot username bilan boshlash
-            original_name = os.path.basename(result_path)
-            clean_name = original_name
-            
-            new_filename = f"@{BOT_INFO.username}_{clean_name}"
-            
-            # Caption yaratish (fayl nomi bilan)
-            # Asl fayl nomini olish (.txt kengaytmasiz)
-            display_name = clean_name.replace(".txt", "")
-            caption = f"{get_text(lang, 'file_ready')}\n\n📝 <b>{display_name}</b>\n\n{get_text(lang, 'converted_via').format(bot_name=BOT_INFO.mention_html(BOT_INFO.first_name))}"
-            
-            await message.answer_document(
-                types.FSInputFile(result_path, filename=new_filename),
-                caption=caption,
-                parse_mode="HTML"
-            )
-            
-            # Fayllarni o'chirish (DOCX va TXT)
+    tasks = start_order_conversion(files_to_convert, formats, message.chat.id, PAID)
+    try:
+        for item, task in zip(files_to_convert, tasks):
             try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                if os.path.exists(txt_path):
-                    os.remove(txt_path)
-            except Exception as e:
-                print(f"Fayl o'chirishda xatolik: {e}")
+                outputs = await task
                 
-        except Exception as e:
-            await message.answer(f"❌ Xatolik: {file_path} - {e}")
-    
-    # User papkasini o'chirish (bo'sh bo'lsa)
-    try:
-        if files_to_convert:
-            user_folder = os.path.dirname(files_to_convert[0])
-            if os.path.exists(user_folder) and not os.listdir(user_folder):
-                os.rmdir(user_folder)
-    except Exception as e:
-        print(f"Papka o'chirishda xatolik: {e}")
+                for fmt, data in outputs.items():
+                    new_filename, caption = build_result_caption(item["path"], lang, WRITERS[fmt].extension)
+                    await message.answer_document(
+                        types.BufferedInputFile(data, filename=new_filename),
+                        caption=caption,
+                        parse_mode="HTML"
+                    )
+            except Exception as e:
+                await message.answer(f"❌ Xatolik: {os.path.basename(item['path'])} - {e}")
+    finally:
+        # Kutilmagan holatda qolgan konvertatsiyalarni to'xtatish
+        for task in tasks:
+            task.cancel()
+        
+        # DOCX fayllarni va bo'sh user papkasini o'chirish
+        remove_order_files(files_to_convert)
     
     await message.answer(get_text(lang, "done"))
 
 
-async def process_conversion_direct(chat_id: int, files_to_convert: list, lang: str):
+async def process_conversion_direct(chat_id: int, files_to_convert: list, lang: str, formats: list | None = None):
     """Fayllarni konvertatsiya qilish (chat_id bilan)"""
-    import os
+    if CONVERT_QUEUE:
+        # To'g'ridan-to'g'ri konvertatsiya faqat admin uchun - navbatda ham ustuvor sinf saqlanadi
+        await enqueue_conversion(chat_id, files_to_convert, lang, formats, ADMIN)
+        return
     
     await bot.send_message(chat_id, f"📦 {len(files_to_convert)}ta fayl tayyorlanmoqda...")
     
-    for file_path in files_to_convert:
-        try:
-            txt_path = file_path.replace(".docx", ".txt")
-            result_path = convert_docx_to_txt(file_path, txt_path)
-            
-            # Fayl nomini bot username bilan boshlash
-            original_name = os.path.basename(result_path)
-            clean_name = original_name
-            
-            new_filename = f"@{BOT_INFO.username}_{clean_name}"
-            
-            # Caption yaratish (fayl nomi bilan)
-            display_name = clean_name.replace(".txt", "")
-            caption = f"{get_text(lang, 'file_ready')}\n\n📝 <b>{display_name}</b>\n\n{get_text(lang, 'converted_via').format(bot_name=BOT_INFO.mention_html(BOT_INFO.first_name))}"
-            
-            await bot.send_document(
-                chat_id=chat_id,
-                document=types.FSInputFile(result_path, filename=new_filename),
-                caption=caption,
-                parse_mode="HTML"
-            )
-            
-            # Fayllarni o'chirish (DOCX va TXT)
+    # To'g'ridan-to'g'ri konvertatsiya faqat admin uchun - ustuvor sinf
+    tasks = start_order_conversion(files_to_convert, formats, chat_id, ADMIN)
+    try:
+        for item, task in zip(files_to_convert, tasks):
             try:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                if os.path.exists(txt_path):
-                    os.remove(txt_path)
-            except Exception as e:
-                print(f"Fayl o'chirishda xatolik: {e}")
+                outputs = await task
                 
-        except Exception as e:
-            await bot.send_message(chat_id, f"❌ Xatolik: {file_path} - {e}")
-    
-    # User papkasini o'chirish (bo'sh bo'lsa)
-    try:
-        if files_to_convert:
-            user_folder = os.path.dirname(files_to_convert[0])
-            if os.path.exists(user_folder) and not os.listdir(user_folder):
-                os.rmdir(user_folder)
-    except Exception as e:
-        print(f"Papka o'chirishda xatolik: {e}")
+                for fmt, data in outputs.items():
+                    new_filename, caption = build_result_caption(item["path"], lang, WRITERS[fmt].extension)
+                    await bot.send_document(
+                        chat_id=chat_id,
+                        document=types.BufferedInputFile(data, filename=new_filename),
+                        caption=caption,
+                        parse_mode="HTML"
+                    )
+            except Exception as e:
+                await bot.send_message(chat_id, f"❌ Xatolik: {os.path.basename(item['path'])} - {e}")
+    finally:
+        # Kutilmagan holatda qolgan konvertatsiyalarni to'xtatish
+        for task in tasks:
+            task.cancel()
+        
+        # DOCX fayllarni va bo'sh user papkasini o'chirish
+        remove_order_files(files_to_convert)
     
     await bot.send_message(chat_id, get_text(lang, "done"))
 
 
 @dp.pre_checkout_query()
 async def pre_checkout_query(pre_checkout_q: types.PreCheckoutQuery):
+    import json
+    
+    # Buyurtma hali kutilayotganini tekshirish (timeout bo'lgan yoki balansdan to'langan bo'lsa - rad etiladi)
+    try:
+        invoice_id = json.loads(pre_checkout_q.invoice_payload).get("invoice_id")
+    except (json.JSONDecodeError, AttributeError):
+        invoice_id = None  # Eski format (faqat fayl path) - tekshirilmaydi
+    
+    if invoice_id is not None:
+        key, order = pending_orders.by_invoice(invoice_id)
+        if order is None or order.get("paying"):
+            lang = user_language(user_profiles.get(pre_checkout_q.from_user.id))
+            await bot.answer_pre_checkout_query(
+                pre_checkout_q.id, ok=False, error_message=get_text(lang, "order_expired")
+            )
+            return
+    
     await bot.answer_pre_checkout_query(pre_checkout_q.id, ok=True)
 
 
 @dp.message(F.successful_payment)
-async def successful_payment(message: types.Message):
+async def successful_payment(message: types.Message, session: AsyncSession, profile: UserProfile | None):
     import json
     
     payload_str = message.successful_payment.invoice_payload
     
-    async for session in get_session():
-        stmt = select(User.language).where(User.telegram_id == message.from_user.id)
-        lang = (await session.execute(stmt)).scalar() or "uz"
+    lang = user_language(profile)
 
     try:
         # Payload ni parse qilish
         payload = json.loads(payload_str)
         invoice_id = payload.get("invoice_id")
         payment_method = payload.get("payment_method", "click")
+        # Buyurtmani invoice_id indeksi orqali bir marta topish
+        key, order = pending_orders.by_invoice(invoice_id)
         
         # Invoice holati tekshirish - duplicate payment oldini olish
-        async for session in get_session():
-            stmt = select(Payment).where(Payment.invoice_id == invoice_id)
-            result = await session.execute(stmt)
-            payment = result.scalar_one_or_none()
-            
-            if payment and payment.status == "paid":
-                await message.answer("⚠️ Bu invoice allaqachon to'langan!")
-                return
-            
-            if payment:
-                payment.status = "paid"
-                payment.paid_at = datetime.now()
-                await session.commit()
+        stmt = select(Payment).where(Payment.invoice_id == invoice_id)
+        result = await session.execute(stmt)
+        payment = result.scalar_one_or_none()
+        
+        if payment and payment.status == "paid":
+            await message.answer("⚠️ Bu invoice allaqachon to'langan!")
+            return
+        
+        if payment:
+            payment.status = "paid"
+            payment.paid_at = datetime.now()
+            await session.commit()
         
         # Agar qisman to'lov bo'lsa, balansdan ham yechish kerak
         if payment_method == "click":
             # Click to'lovi - balansdan ham yechish mumkin
-            files_to_convert = []
-            total_price = 0
-            
-            for key, group_data in list(pending_group_files.items()):
-                if group_data.get("invoice_id") == invoice_id:
-                    files_to_convert = group_data.get("files", [])
-                    total_price = group_data.get("total_price", 0)
-                    break
+            total_price = order.get("total_price", 0) if order else 0
             
             # Click summasini olish
             click_amount = message.successful_payment.total_amount / 100
@@ -1097,51 +1234,34 @@ async def successful_payment(message: types.Message):
             if click_amount < total_price:
                 balance_amount = total_price - click_amount
                 
-                # Balansdan yechish
-                async for session in get_session():
-                    stmt = select(User).where(User.telegram_id == message.from_user.id)
-                    result = await session.execute(stmt)
-                    user = result.scalar_one_or_none()
-                    
-                    if user and user.balance >= balance_amount:
-                        user.balance -= balance_amount
-                        await session.commit()
-                        await message.answer(f"💰 Balansdan {balance_amount:,.0f} UZS yechildi")
+                # Balansdan yechish (mablag' yetarli bo'lsagina)
+                row = await ledger.debit(
+                    session, message.from_user.id, balance_amount, ledger.PARTIAL_PAYMENT, invoice_id
+                )
+                
+                if row is not None:
+                    await session.commit()
+                    ledger.remember(message.from_user.id, row)
+                    await message.answer(f"💰 Balansdan {balance_amount:,.0f} UZS yechildi")
         
         await message.answer(get_text(lang, "paid"))
         
-        # Invoice_id bo'yicha pending_group_files dan fayllarni topish
-        files_to_convert = []
-        key_to_delete = None
-        
-        for key, group_data in list(pending_group_files.items()):
-            if group_data.get("invoice_id") == invoice_id:
-                files_to_convert = group_data.get("files", [])
-                key_to_delete = key
-                break
+        # Buyurtma fayllari (yuqorida invoice_id bo'yicha topilgan)
+        files_to_convert = order.get("files", []) if order else []
         
         if files_to_convert:
-            # Payment timeout taskni bekor qilish
-            if key_to_delete and key_to_delete in payment_timeout_tasks:
-                payment_timeout_tasks[key_to_delete].cancel()
-                del payment_timeout_tasks[key_to_delete]
+            # Pending groupni tozalash (payment timeout task ham bekor qilinadi)
+            drop_pending_order(key)
             
             # Fayllarni konvertatsiya qilish
-            await process_conversion(message, files_to_convert, lang)
-            
-            # Pending groupni tozalash
-            if key_to_delete:
-                if key_to_delete in pending_group_files:
-                    del pending_group_files[key_to_delete]
-                if key_to_delete in group_timeout_tasks:
-                    del group_timeout_tasks[key_to_delete]
+            await process_conversion(message, files_to_convert, lang, order.get("formats"))
         
     except json.JSONDecodeError:
         # Eski format (faqat fayl path) uchun
         await message.answer(get_text(lang, "paid"))
         txt_path = payload_str.replace(".docx", ".txt")
         try:
-            result_path = convert_docx_to_txt(payload_str, txt_path)
+            result_path = await run_in_pool(convert_docx_to_txt, payload_str, txt_path)
             
             # Fayl nomini bot username bilan boshlash
             import os
@@ -1170,16 +1290,6 @@ async def successful_payment(message: types.Message):
         await message.answer(f"❌ Xatolik: {e}")
 
 
-def get_offer_link(lang: str, settings: Settings | None) -> str:
-    if not settings:
-        return "https://t.me/oxu_docx"
-    return {
-        "uz": settings.uz_offer,
-        "ru": settings.ru_offer,
-        "en": settings.en_offer,
-    }.get(lang, settings.uz_offer)
-
-
 async def main():
     global BOT_INFO
     
@@ -1190,7 +1300,24 @@ async def main():
     BOT_INFO = await bot.get_me()
     print(f"✅ Bot ishga tushdi... (@{BOT_INFO.username})")
     
-    await dp.start_polling(bot)
+    # Sozlamalar xotiraga yuklanadi; boshqa instance'lardagi o'zgarishlar LISTEN orqali keladi
+    await settings_store.load()
+    settings_task = asyncio.create_task(settings_store.listen())
+    
+    reconcile_task = None
+    if CHANNEL_USERNAME:
+        await membership_index.load()
+        if MEMBERSHIP_RECONCILE_INTERVAL > 0:
+            reconcile_task = asyncio.create_task(reconcile_membership())
+    
+    try:
+        # chat_member updatelari faqat allowed_updates da so'ralganda keladi
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        settings_task.cancel()
+        if reconcile_task:
+            reconcile_task.cancel()
+        shutdown_pool()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,47 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.future import select
+
+from database.db import AsyncSessionLocal
+from database.models import User
+from handlers.profiles import user_profiles
+
+
+class DatabaseMiddleware(BaseMiddleware):
+    """
+    Har bir update uchun bitta session va user profilini beradi.
+
+    Handlerlarga `session`, `profile` (UserProfile, keshdan) va `db_user` argumentlari beriladi
+    (ro'yxatdan o'tmagan bo'lsa profile va db_user - None).
+    User qatori faqat profil keshda bo'lmasa yoki handler `db_user` ni so'rasa (yozish uchun)
+    o'qiladi - oddiy navigatsiya DB ga umuman murojaat qilmaydi.
+    User o'qilgandan keyin tranzaksiya yopiladi - ulanish poolga qaytadi va handler uzoq
+    kutishlar (fayl yuklab olish, konvertatsiya) paytida uni band qilib turmaydi.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        handler_object = data.get("handler")
+        wants_user = handler_object is not None and "db_user" in handler_object.params
+
+        # Session ulanishni birinchi so'rovda oladi - keshdan javob berilsa ochilmaydi ham
+        async with AsyncSessionLocal() as session:
+            db_user = None
+            profile = user_profiles.get(user.id) if user is not None else None
+            if user is not None and (profile is None or wants_user):
+                stmt = select(User).where(User.telegram_id == user.id)
+                db_user = (await session.execute(stmt)).scalar_one_or_none()
+                await session.commit()  # expire_on_commit=False - db_user ishlatilaveradi
+                profile = user_profiles.put(db_user)
+
+            data["session"] = session
+            data["profile"] = profile
+            data["db_user"] = db_user
+            return await handler(event, data)
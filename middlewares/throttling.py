@@ -0,0 +1,143 @@
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from config import ADMIN_ID, THROTTLE_RULES
+from handlers.promocode import PromoStates
+from utils import get_text
+
+# Shuncha sekundda bir marta to'lgan (keraksiz) bucketlar xotiradan o'chiriladi
+SWEEP_INTERVAL = 60
+
+
+class TokenBucket:
+    """Oddiy token bucket: burst ta token, sekundiga rate ta token qayta to'ladi"""
+    __slots__ = ("tokens", "updated", "notified")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+        self.notified = 0.0  # Oxirgi rad etish xabari vaqti (spam qilmaslik uchun)
+
+
+class RateLimiter:
+    """
+    User va amal (upload, callback, promo, message) bo'yicha token bucketlar.
+
+    rules - {amal: (rate, burst)}; rate - sekundiga tiklanadigan tokenlar.
+    """
+
+    def __init__(self, rules: dict):
+        self.rules = rules
+        self._buckets: dict = {}
+        self._last_sweep = time.monotonic()
+        self.rejected = 0
+
+    def _sweep(self, now: float):
+        """To'liq tiklangan bucketlar - default holatdan farqi yo'q, o'chirib yuboriladi"""
+        self._last_sweep = now
+        expired = []
+        for (user_id, action), bucket in self._buckets.items():
+            rate, burst = self.rules[action]
+            if bucket.tokens + (now - bucket.updated) * rate >= burst:
+                expired.append((user_id, action))
+        for key in expired:
+            del self._buckets[key]
+
+    def hit(self, user_id: int, action: str) -> tuple:
+        """
+        Bitta token sarflashga urinadi.
+
+        Returns:
+            (ruxsat, kutish_sekund, xabar_berish_kerakmi)
+        """
+        now = time.monotonic()
+        if now - self._last_sweep > SWEEP_INTERVAL:
+            self._sweep(now)
+
+        rate, burst = self.rules[action]
+        bucket = self._buckets.get((user_id, action))
+        if bucket is None:
+            bucket = self._buckets[(user_id, action)] = TokenBucket(burst, now)
+        else:
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return True, 0.0, False
+
+        self.rejected += 1
+        retry_after = (1 - bucket.tokens) / rate if rate else SWEEP_INTERVAL
+        # Bir bucket bo'sh turganda userga faqat bir marta xabar beriladi
+        notify = now - bucket.notified >= retry_after
+        if notify:
+            bucket.notified = now
+        return False, retry_after, notify
+
+    def stats(self) -> dict:
+        return {"buckets": len(self._buckets), "rejected": self.rejected}
+
+
+limiter = RateLimiter(THROTTLE_RULES)
+
+
+def _event_action(event: TelegramObject, data: dict) -> str | None:
+    if isinstance(event, CallbackQuery):
+        return "callback"
+    if isinstance(event, Message):
+        # To'lov tasdig'i hech qachon cheklanmaydi (pul yechilgan bo'ladi)
+        if event.successful_payment:
+            return None
+        if event.document:
+            return "upload"
+        if data.get("raw_state") == PromoStates.entering_promo.state:
+            return "promo"
+        return "message"
+    return None
+
+
+def _event_lang(event: TelegramObject) -> str:
+    """DB ga murojaat qilmasdan Telegram tilidan foydalanamiz (rad etish arzon bo'lishi kerak)"""
+    code = (event.from_user.language_code or "") if event.from_user else ""
+    code = code.split("-")[0]
+    return code if code in ("uz", "ru", "en") else "uz"
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Har bir user uchun so'rovlar tezligini cheklovchi outer middleware.
+
+    Limitdan oshgan update handlerga (DB, yuklab olish, parse) umuman yetib bormaydi.
+    Admin cheklanmaydi.
+    """
+
+    def __init__(self, rate_limiter: RateLimiter = limiter):
+        self.limiter = rate_limiter
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user = getattr(event, "from_user", None)
+        action = _event_action(event, data)
+        if user is None or action is None or action not in self.limiter.rules or user.id == ADMIN_ID:
+            return await handler(event, data)
+
+        allowed, retry_after, notify = self.limiter.hit(user.id, action)
+        if allowed:
+            return await handler(event, data)
+
+        text = get_text(_event_lang(event), "rate_limited").format(seconds=max(1, round(retry_after)))
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(text, show_alert=False)
+            elif notify:
+                await event.answer(text)
+        except Exception as e:
+            print(f"Throttling xabarida xatolik: {e}")
+        return None
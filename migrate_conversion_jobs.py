@@ -0,0 +1,26 @@
+"""
+Migration script to add conversion_jobs.priority (admin/paid ustuvorlik sinfi)
+Run this once: python migrate_conversion_jobs.py
+"""
+import asyncio
+from sqlalchemy import text
+from database.db import engine
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("🔄 Starting migration...")
+
+        # Add priority column (eski joblar - oddiy to'langan buyurtmalar)
+        try:
+            await conn.execute(text("""
+                ALTER TABLE conversion_jobs
+                ADD COLUMN IF NOT EXISTS priority VARCHAR(16) DEFAULT 'paid';
+            """))
+            print("✅ Added priority column")
+        except Exception as e:
+            print(f"⚠️ priority: {e}")
+
+        print("\n✅ Migration completed successfully!")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
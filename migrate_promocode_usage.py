@@ -0,0 +1,41 @@
+"""
+Migration script to make promocode_usage (promocode_id, user_id) unique
+Run this once: python migrate_promocode_usage.py
+"""
+import asyncio
+from sqlalchemy import text
+from database.db import engine
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("🔄 Starting migration...")
+
+        # Takroriy foydalanishlarni o'chirish (eng birinchisi qoladi)
+        result = await conn.execute(text("""
+            DELETE FROM promocode_usage a
+            USING promocode_usage b
+            WHERE a.promocode_id = b.promocode_id
+              AND a.user_id = b.user_id
+              AND a.id > b.id;
+        """))
+        print(f"✅ Removed duplicate usages ({result.rowcount} rows)")
+
+        # Create unique constraint (qayta ishga tushirilsa - o'tkazib yuboriladi)
+        try:
+            await conn.execute(text("""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_promocode_usage_user') THEN
+                        ALTER TABLE promocode_usage
+                        ADD CONSTRAINT uq_promocode_usage_user UNIQUE (promocode_id, user_id);
+                    END IF;
+                END $$;
+            """))
+            print("✅ Added unique constraint on (promocode_id, user_id)")
+        except Exception as e:
+            print(f"⚠️ uq_promocode_usage_user: {e}")
+
+        print("\n✅ Migration completed successfully!")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
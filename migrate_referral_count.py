@@ -0,0 +1,53 @@
+"""
+Migration script to add users.referral_count and backfill it from users.referred_by
+Run this once (safe to re-run - recomputes counters): python migrate_referral_count.py
+"""
+import asyncio
+from sqlalchemy import text
+from database.db import engine
+
+async def migrate():
+    async with engine.begin() as conn:
+        print("🔄 Starting migration...")
+
+        # Add referral_count column
+        try:
+            await conn.execute(text("""
+                ALTER TABLE users
+                ADD COLUMN IF NOT EXISTS referral_count INTEGER DEFAULT 0;
+            """))
+            print("✅ Added referral_count column")
+        except Exception as e:
+            print(f"⚠️ referral_count: {e}")
+
+        # Create index on referred_by (backfill va admin statistikasi uchun)
+        try:
+            await conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_users_referred_by
+                ON users(referred_by);
+            """))
+            print("✅ Created index on referred_by")
+        except Exception as e:
+            print(f"⚠️ index referred_by: {e}")
+
+    # Backfill alohida tranzaksiyada - ustun qo'shilishi xatosiz bo'lsa ham qayta hisoblanadi
+    async with engine.begin() as conn:
+        result = await conn.execute(text("""
+            UPDATE users u
+            SET referral_count = COALESCE(c.cnt, 0)
+            FROM users t
+            LEFT JOIN (
+                SELECT referred_by, COUNT(*) AS cnt
+                FROM users
+                WHERE referred_by IS NOT NULL
+                GROUP BY referred_by
+            ) c ON c.referred_by = t.telegram_id
+            WHERE u.id = t.id
+              AND u.referral_count IS DISTINCT FROM COALESCE(c.cnt, 0);
+        """))
+        print(f"✅ Backfilled referral_count ({result.rowcount} rows updated)")
+
+        print("\n✅ Migration completed successfully!")
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -1,14 +1,95 @@
 import os
+import io
+import time
+import hashlib
+import zipfile
 from docx import Document
 import json
+from config import DOCX_MAX_FILE_MB, DOCX_MAX_UNCOMPRESSED_MB, DOCX_MAX_RATIO, DOCX_MAX_ENTRIES, LOCALE_RELOAD_INTERVAL
+
+# ZIP local file header imzosi (DOCX - zip arxiv)
+ZIP_MAGIC = b"PK\x03\x04"
+# Shundan kichik qismlar siqish koeffitsienti bo'yicha tekshirilmaydi (kichik XML juda yaxshi siqiladi)
+RATIO_MIN_BYTES = 1024 * 1024
 
 def ensure_dir(path: str):
     if not os.path.exists(path):
         os.makedirs(path)
 
+def file_sha256(path: str) -> str:
+    """Fayl tarkibining SHA-256 qiymatini (hex) qaytaradi"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def bytes_sha256(data: bytes) -> str:
+    """Xotiradagi baytlarning SHA-256 qiymatini (hex) qaytaradi"""
+    return hashlib.sha256(data).hexdigest()
+
 def validate_docx(filename: str) -> bool:
     return filename.lower().endswith(".docx")
 
+def docx_size_allowed(file_size: int | None) -> bool:
+    """Telegram bergan fayl hajmi ruxsat etilganmi (yuklab olishdan oldin)"""
+    return file_size is None or file_size <= DOCX_MAX_FILE_MB * 1024 * 1024
+
+def inspect_docx(source) -> str | None:
+    """
+    DOCX arxivni parse qilishdan oldin tekshiradi (zip-bomb va buzilgan fayllar).
+    
+    Faqat magic baytlar va zip central directory o'qiladi - arxiv ochilmaydi.
+    Zipfile qismlarni e'lon qilingan hajmdan ortiq ochmaydi, shuning uchun
+    bu yerdagi cheklovlar parse paytida ham amal qiladi.
+    
+    source - fayl yo'li yoki xotiradagi baytlar.
+    
+    Returns:
+        None - fayl yaroqli, aks holda rad etish sababi (locale kaliti)
+    """
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            header = bytes(source[:4])
+            archive_source = io.BytesIO(source)
+        else:
+            with open(source, "rb") as f:
+                header = f.read(4)
+            archive_source = source
+        
+        if header != ZIP_MAGIC:
+            return "not_docx"
+        
+        with zipfile.ZipFile(archive_source) as archive:
+            entries = archive.infolist()
+            
+            if len(entries) > DOCX_MAX_ENTRIES:
+                return "file_rejected"
+            
+            names = {entry.filename for entry in entries}
+            if "[Content_Types].xml" not in names:
+                return "not_docx"
+            
+            total_size = 0
+            total_compressed = 0
+            for entry in entries:
+                total_size += entry.file_size
+                total_compressed += entry.compress_size
+                
+                # Bitta qism juda kuchli siqilgan bo'lsa - zip-bomb belgisi
+                if entry.file_size > RATIO_MIN_BYTES and entry.file_size > entry.compress_size * DOCX_MAX_RATIO:
+                    return "file_rejected"
+            
+            if total_size > DOCX_MAX_UNCOMPRESSED_MB * 1024 * 1024:
+                return "file_rejected"
+            if total_size > RATIO_MIN_BYTES and total_size > max(total_compressed, 1) * DOCX_MAX_RATIO:
+                return "file_rejected"
+    
+    except (zipfile.BadZipFile, OSError, ValueError):
+        return "file_rejected"
+    
+    return None
+
 def convert_docx_to_txt(docx_path: str, txt_path: str):
     doc = Document(docx_path)
     with open(txt_path, "w", encoding="utf-8") as f:
@@ -16,22 +97,95 @@ def convert_docx_to_txt(docx_path: str, txt_path: str):
             f.write(para.text + "\n")
     return txt_path
 
-def get_text(lang: str, key: str) -> str:
-    try:
-        # Fayl manzilini to‘liq aniqlash
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        file_path = os.path.join(base_dir, "locale", f"{lang}.json")
+def result_caption(bot_info, file_path: str, lang: str, extension: str = "txt") -> tuple:
+    """Natija fayl nomi (bot username bilan) va caption'ini qaytaradi"""
+    display_name = os.path.basename(file_path).replace(".docx", "")
+    new_filename = f"@{bot_info.username}_{display_name}.{extension}"
+    
+    # Caption yaratish (asl fayl nomi kengaytmasiz)
+    caption = f"{get_text(lang, 'file_ready')}\n\n📝 <b>{display_name}</b>\n\n{get_text(lang, 'converted_via').format(bot_name=bot_info.mention_html(bot_info.first_name))}"
+    return new_filename, caption
 
-        # Agar fayl yo‘q bo‘lsa — default "uz.json" dan o‘qisin
-        if not os.path.exists(file_path):
-            file_path = os.path.join(base_dir, "locale", "uz.json")
+class LocaleCatalog:
+    """
+    locale/*.json matnlari - bir marta yuklanadi, get_text() oddiy dict qidiruvi.
+    
+    Fallback zanjiri (til -> uz -> kalit) yuklash paytida hal qilinadi: har bir til
+    lug'ati uz.json ustiga yozilgan to'liq nusxa.
+    
+    reload_interval > 0 bo'lsa, shu oraliqda fayllarning mtime tekshiriladi va
+    o'zgargan bo'lsa katalog qayta yuklanadi (botni qayta ishga tushirmasdan).
+    """
+    
+    def __init__(self, directory: str, default_lang: str = "uz", reload_interval: float = 0):
+        self.directory = directory
+        self.default_lang = default_lang
+        self.reload_interval = reload_interval
+        self.version = 0  # Har qayta yuklashda oshadi (matn keshlarini bekor qilish uchun)
+        self._catalog = {}
+        self._default = {}
+        self._mtimes = {}
+        self._checked_at = 0.0
+        self.load()
+    
+    def _scan(self) -> dict:
+        mtimes = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                mtimes[name[:-5]] = os.path.getmtime(path)
+        return mtimes
+    
+    def load(self):
+        mtimes = self._scan()
+        raw = {}
+        for lang in mtimes:
+            try:
+                with open(os.path.join(self.directory, f"{lang}.json"), "r", encoding="utf-8") as f:
+                    raw[lang] = json.load(f)
+            except Exception as e:
+                # Buzilgan fayl - oldingi nusxasi saqlanib qoladi
+                print(f"⚠️ Locale yuklashda xatolik ({lang}): {e}")
+                raw[lang] = self._catalog.get(lang, {})
+        
+        default = raw.get(self.default_lang, {})
+        self._catalog = {lang: {**default, **data} for lang, data in raw.items()}
+        self._default = self._catalog.get(self.default_lang, {})
+        self._mtimes = mtimes
+        self._checked_at = time.monotonic()
+        self.version += 1
+    
+    def maybe_reload(self) -> bool:
+        """Fayllar o'zgargan bo'lsa qayta yuklaydi (reload_interval da bir martadan ko'p tekshirmaydi)"""
+        if self.reload_interval <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return False
+        
+        self._checked_at = now
+        try:
+            if self._scan() == self._mtimes:
+                return False
+        except OSError as e:
+            print(f"⚠️ Locale papkasini tekshirishda xatolik: {e}")
+            return False
+        
+        self.load()
+        print(f"🔄 Locale qayta yuklandi (versiya {self.version})")
+        return True
+    
+    def get(self, lang: str, key: str) -> str:
+        if self.reload_interval > 0:
+            self.maybe_reload()
+        return self._catalog.get(lang, self._default).get(key, key)
 
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
 
-        # So‘ralgan kalit bo‘lmasa, kalitni o‘zini qaytaradi
-        return data.get(key, key)
+locales = LocaleCatalog(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "locale"),
+    reload_interval=LOCALE_RELOAD_INTERVAL,
+)
 
-    except Exception as e:
-        print(f"⚠️ get_text() error: {e}")
-        return key
\ No newline at end of file
+def get_text(lang: str, key: str) -> str:
+    """Tarjima matni: til -> uz -> kalitning o'zi"""
+    return locales.get(lang, key)
\ No newline at end of file
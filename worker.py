@@ -0,0 +1,175 @@
+import asyncio
+import os
+import socket
+
+from aiogram import Bot, types
+
+from config import BOT_TOKEN, JOB_POLL_INTERVAL, WORKER_CONCURRENCY
+from database.db import engine
+from database.models import Base
+from handlers.cache import conversion_cache
+from handlers.convert import convert_docx_to_formats
+from handlers.executor import run_in_pool, shutdown_pool
+from handlers.jobs import claim_job, complete_job, fail_job
+from handlers.scheduler import conversion_scheduler, ADMIN, PAID, RETRY
+from handlers.writers import WRITERS, normalize_formats
+from utils import ensure_dir, get_text, result_caption
+
+# Navbatdagi konvertatsiyalarni bajaruvchi alohida process (CONVERT_QUEUE=1 bo'lganda).
+# Bir nechta nusxa (yoki konteyner) parallel ishlashi mumkin - joblar FOR UPDATE SKIP LOCKED bilan olinadi.
+
+bot = Bot(BOT_TOKEN)
+BOT_INFO = None
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+# Job holatini yozish (complete/fail) DB xatosida necha marta qayta uriniladi
+FINISH_ATTEMPTS = 3
+
+
+async def load_source(job):
+    """DOCX faylni umumiy papkadan oladi, bo'lmasa file_id orqali Telegramdan yuklab oladi"""
+    if os.path.exists(job.file_path):
+        return job.file_path
+
+    if not job.file_id:
+        raise FileNotFoundError(job.file_path)
+
+    file_info = await bot.get_file(job.file_id)
+    ensure_dir(os.path.dirname(job.file_path))
+    await bot.download_file(file_info.file_path, destination=job.file_path)
+    return job.file_path
+
+
+def remove_job_file(file_path: str):
+    """Konvertatsiya qilingan DOCX ni va bo'sh qolgan user papkasini o'chiradi"""
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        folder = os.path.dirname(file_path)
+        if os.path.exists(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+    except Exception as e:
+        print(f"Fayl o'chirishda xatolik: {e}")
+
+
+async def process_job(job):
+    """
+    Bitta jobni konvertatsiya qilib, natijani userga yuboradi.
+
+    Faqat konvertatsiya xatosi tashqariga chiqadi (job qayta uriniladi). Yuborish xatolari
+    shu yerda yoziladi - job baribir bajarilgan hisoblanadi, aks holda qayta urinishda user
+    allaqachon olgan formatlarni yana oladi.
+    """
+    formats = normalize_formats(job.formats)
+
+    outputs = {}
+    if job.digest:
+        for fmt in formats:
+            cached = conversion_cache.get_output(job.digest, fmt)
+            if cached is not None:
+                outputs[fmt] = cached
+
+    missing = [fmt for fmt in formats if fmt not in outputs]
+    if missing:
+        source = await load_source(job)
+        # Jobning sinfi (admin/paid); qayta urinilayotgan oddiy joblar yangi buyurtmalardan past ustuvorlikda
+        priority = job.priority or PAID
+        if job.attempts > 1 and priority != ADMIN:
+            priority = RETRY
+        async with conversion_scheduler.slot(job.telegram_id, priority):
+            rendered = await run_in_pool(convert_docx_to_formats, source, missing)
+        for fmt, data in rendered.items():
+            outputs[fmt] = data
+            if job.digest:
+                conversion_cache.put_output(job.digest, fmt, data)
+
+    for fmt in formats:
+        new_filename, caption = result_caption(BOT_INFO, job.file_path, job.lang, WRITERS[fmt].extension)
+        try:
+            await bot.send_document(
+                chat_id=job.chat_id,
+                document=types.BufferedInputFile(outputs[fmt], filename=new_filename),
+                caption=caption,
+                parse_mode="HTML"
+            )
+        except Exception as e:
+            print(f"Natijani yuborishda xatolik: id={job.id}, format={fmt}, error={type(e).__name__}: {e}")
+
+
+async def finish_job(call, *args):
+    """
+    complete_job/fail_job ni DB xatosida bir necha marta qayta urinib chaqiradi.
+
+    Returns:
+        (saved, natija) - saved=False bo'lsa urinishlar tugadi (job JOB_LOCK_TIMEOUT dan keyin qayta olinadi)
+    """
+    for attempt in range(1, FINISH_ATTEMPTS + 1):
+        try:
+            return True, await call(*args)
+        except Exception as e:
+            print(f"Job holatini yozishda xatolik: {call.__name__}{args[:1]}, attempt={attempt}, error={e}")
+            await asyncio.sleep(JOB_POLL_INTERVAL * 5 * attempt)
+    return False, None
+
+
+async def worker_loop(slot: int):
+    """Navbatdan joblarni olib bajaradi; navbat bo'sh bo'lsa JOB_POLL_INTERVAL kutadi"""
+    worker_id = f"{WORKER_ID}/{slot}"
+
+    while True:
+        try:
+            job = await claim_job(worker_id)
+        except Exception as e:
+            print(f"Job olishda xatolik: {e}")
+            await asyncio.sleep(JOB_POLL_INTERVAL * 5)
+            continue
+
+        if job is None:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        try:
+            await process_job(job)
+        except Exception as e:
+            print(f"Job xatosi: id={job.id}, attempt={job.attempts}, error={type(e).__name__}: {e}")
+            saved, result = await finish_job(fail_job, job.id, f"{type(e).__name__}: {e}")
+            if not saved:
+                continue
+            failed, finished = result
+            if failed:
+                remove_job_file(job.file_path)
+                try:
+                    await bot.send_message(job.chat_id, f"❌ Xatolik: {os.path.basename(job.file_path)} - {e}")
+                    if finished:
+                        await bot.send_message(job.chat_id, get_text(job.lang, "done"))
+                except Exception as send_error:
+                    print(f"Xabar yuborishda xatolik: {send_error}")
+            continue
+
+        saved, finished = await finish_job(complete_job, job.id)
+        if not saved:
+            continue  # Fayl qoladi - job qayta olinsa undan foydalanadi
+        remove_job_file(job.file_path)
+        if finished:
+            try:
+                await bot.send_message(job.chat_id, get_text(job.lang, "done"))
+            except Exception as e:
+                print(f"Xabar yuborishda xatolik: {e}")
+
+
+async def main():
+    global BOT_INFO
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    BOT_INFO = await bot.get_me()
+    print(f"✅ Worker ishga tushdi... ({WORKER_ID}, {WORKER_CONCURRENCY} ta slot)")
+
+    try:
+        await asyncio.gather(*(worker_loop(slot) for slot in range(WORKER_CONCURRENCY)))
+    finally:
+        shutdown_pool()
+        await bot.session.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())